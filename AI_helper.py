@@ -1,4 +1,5 @@
 import os
+import hashlib
 import requests
 import streamlit as st
 from dotenv import load_dotenv
@@ -42,6 +43,16 @@ def reset_ai_conversation():
     ]
     context.clear()
 
+def conversation_fingerprint():
+    """Короткий хэш текущей истории диалога и контекста (ключ для кэша ответов)."""
+    payload = repr((chat_history, sorted(context.items()))).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+def remember_exchange(message, reply):
+    """Добавляет в историю пару вопрос/ответ, полученную без запроса к API (из кэша)."""
+    chat_history.append({"role": "user", "content": message})
+    chat_history.append({"role": "assistant", "content": reply})
+
 # === Универсальная функция с учётом контекста ===
 def get_chatgpt_response(prompt, model="mistralai/mistral-nemo:free"):
     """Запрос в ИИ с подстановкой глобального контекста."""
@@ -1,10 +1,13 @@
 import pandas as pd
-import io
+import numpy as np
 import os
 import streamlit as st
 
+from Utils.cache_utils import DF_HASH_FUNCS, get_data_sig
+
 # ======= Общие =======
 
+@st.cache_data(show_spinner=False, hash_funcs=DF_HASH_FUNCS)
 def summarize_missing(df: pd.DataFrame) -> pd.DataFrame:
     """
     Возвращает DataFrame со столбцами:
@@ -42,62 +45,69 @@ def standard_auto_cleaning(df: pd.DataFrame, target_col: str = None):
     Возвращает (new_df, cleaning_log), где cleaning_log — список dict:
       column, missing_count, pct_missing, action
     """
-    df_clean = df.copy()
-    total = len(df_clean)
-    log = []
-
-    for col in df.columns:
-        miss = df_clean[col].isna().sum()
-        if miss == 0:
-            continue
-
-        pct = miss / total * 100
-        pct_r = round(pct, 1)
-
-        # Целевая переменная
-        if target_col and col == target_col:
-            before = len(df_clean)
-            df_clean.dropna(subset=[col], inplace=True)
-            dropped = before - len(df_clean)
-            action = f"дроп строк в target ({dropped} шт.)"
-
-        # <5% NaN — удаляем строки
-        elif pct < 5:
-            before = len(df_clean)
-            df_clean.dropna(subset=[col], inplace=True)
-            dropped = before - len(df_clean)
-            action = f"удалено строк ({dropped} шт.)"
-
-        # <20% NaN — заполняем
-        elif pct < 20:
-            s = df_clean[col]
-            if pd.api.types.is_numeric_dtype(s) and not is_categorical(s):
-                val = s.median()
-                df_clean[col].fillna(val, inplace=True)
-                action = f"заполнено median={val:.2f}"
+    total = len(df)
+    # пропуски считаются один раз по исходным данным, решения — масками по всем столбцам
+    nulls = df.isna().sum()
+    nulls = nulls[nulls > 0]
+    pcts = nulls / total * 100
+    is_target = (nulls.index == target_col) if target_col else np.zeros(len(nulls), dtype=bool)
+
+    drop_row_cols = nulls.index[is_target | (pcts < 5).to_numpy()]
+    fill_cols = nulls.index[~is_target & ((pcts >= 5) & (pcts < 20)).to_numpy()]
+    drop_cols = nulls.index[~is_target & (pcts >= 50).to_numpy()]
+
+    df_clean = df
+    actions = {}
+
+    # Строки удаляются одним dropna; каждая строка засчитывается первому
+    # столбцу (в порядке df.columns), где у неё пропуск
+    if len(drop_row_cols):
+        na = df[drop_row_cols].isna().to_numpy()
+        hit = na.any(axis=1)
+        dropped = np.bincount(na[hit].argmax(axis=1), minlength=len(drop_row_cols))
+        df_clean = df_clean.loc[~hit]
+        for col, cnt in zip(drop_row_cols, dropped):
+            if col == target_col:
+                actions[col] = f"дроп строк в target ({cnt} шт.)"
             else:
-                mode = s.mode()
-                if not mode.empty:
-                    val = mode[0]
-                    df_clean[col].fillna(val, inplace=True)
-                    action = f"заполнено mode='{val}'"
-                else:
-                    action = "не заполнено: mode пустой"
-
-        # ≥50% NaN — удаляем колонку
-        elif pct >= 50:
-            df_clean.drop(columns=[col], inplace=True)
-            action = f"колонка удалена (≥50% NaN)"
-
-        # Остальное — на ручную проверку
-        else:
-            action = f"оставлено без изменений ({pct_r}% пропусков)"
+                actions[col] = f"удалено строк ({cnt} шт.)"
+
+    # ≥50% NaN — удаляем колонки
+    if len(drop_cols):
+        df_clean = df_clean.drop(columns=drop_cols)
+        for col in drop_cols:
+            actions[col] = "колонка удалена (≥50% NaN)"
+
+    # 5–20% NaN — заполняем: числовые медианой, остальные модой, одним fillna
+    num_fill = [c for c in fill_cols
+                if pd.api.types.is_numeric_dtype(df_clean[c]) and not is_categorical(df_clean[c])]
+    cat_fill = [c for c in fill_cols if c not in num_fill]
+    fills = {}
+    if num_fill:
+        for col, val in df_clean[num_fill].median().items():
+            fills[col] = val
+            actions[col] = f"заполнено median={val:.2f}"
+    if cat_fill:
+        modes = df_clean[cat_fill].mode()
+        for col in cat_fill:
+            if modes.empty or pd.isna(modes[col].iloc[0]):
+                actions[col] = "не заполнено: mode пустой"
+            else:
+                val = modes[col].iloc[0]
+                fills[col] = val
+                actions[col] = f"заполнено mode='{val}'"
+    if fills:
+        df_clean = df_clean.fillna(fills)
 
+    log = []
+    for col, miss in nulls.items():
+        pct_r = round(pcts[col], 1)
         log.append({
             "column":        col,
             "missing_count": int(miss),
             "pct_missing":   pct_r,
-            "action":        action
+            # Остальное (20–50%) — на ручную проверку
+            "action":        actions.get(col, f"оставлено без изменений ({pct_r}% пропусков)")
         })
 
     return df_clean, log
@@ -133,17 +143,14 @@ def run_auto_cleaning(df: pd.DataFrame, target_col: str = None):
 
 def drop_rows_na(df: pd.DataFrame, cols: list, target_col: str = None) -> pd.DataFrame:
     """Удаляет все строки, где в любых из cols есть NaN."""
-    df_clean = df.copy()
-    subset = [c for c in cols if c in df_clean.columns]
-    df_clean.dropna(subset=subset, inplace=True)
-    return df_clean
+    # dropna сам возвращает новый DataFrame — предварительная копия не нужна
+    subset = [c for c in cols if c in df.columns]
+    return df.dropna(subset=subset)
 
 def drop_cols_na(df: pd.DataFrame, cols: list) -> pd.DataFrame:
     """Удаляет указанные колонки целиком."""
-    df_clean = df.copy()
-    to_drop = [c for c in cols if c in df_clean.columns]
-    df_clean.drop(columns=to_drop, inplace=True)
-    return df_clean
+    to_drop = [c for c in cols if c in df.columns]
+    return df.drop(columns=to_drop)
 
 def drop_selected_cols(df, cols):
     """Удаляет указанные столбцы из DataFrame."""
@@ -151,24 +158,25 @@ def drop_selected_cols(df, cols):
 
 def fill_na(df: pd.DataFrame, cols: list, method: str, constant_value=None) -> pd.DataFrame:
     """Заполняет пропуски в указанных cols."""
-    df_clean = df.copy()
+    # значения собираются в словарь и применяются одним fillna — без копии заранее
+    fills = {}
     for col in cols:
-        if col not in df_clean.columns:
+        if col not in df.columns:
             continue
-        series = df_clean[col]
+        series = df[col]
         if method == "mean" and pd.api.types.is_numeric_dtype(series):
-            df_clean[col].fillna(series.mean(), inplace=True)
+            fills[col] = series.mean()
         elif method == "median" and pd.api.types.is_numeric_dtype(series):
-            df_clean[col].fillna(series.median(), inplace=True)
+            fills[col] = series.median()
         elif method == "mode":
             mode = series.mode()
             if not mode.empty:
-                df_clean[col].fillna(mode[0], inplace=True)
+                fills[col] = mode[0]
         elif method == "constant":
-            df_clean[col].fillna(constant_value, inplace=True)
+            fills[col] = constant_value
         elif method == "unknown":
-            df_clean[col].fillna("unknown", inplace=True)
-    return df_clean
+            fills[col] = "unknown"
+    return df.fillna(fills) if fills else df
 
 def remove_duplicates(df: pd.DataFrame) -> pd.DataFrame:
     """Удаляет полностью одинаковые строки из DataFrame."""
@@ -211,19 +219,26 @@ def show_na_summary(before: pd.DataFrame,
         st.info("Нет пропусков до обработки")
     else:
         st.markdown(f"**{title_before}**")
-        st.table(cnt_before.rename("NaN").to_frame())
+        st.dataframe(cnt_before.rename("NaN").to_frame(), use_container_width=True)
 
     if cnt_after.empty:
         st.success("Нет пропусков после обработки")
     else:
         st.markdown(f"**{title_after}**")
-        st.table(cnt_after.rename("NaN").to_frame())
+        st.dataframe(cnt_after.rename("NaN").to_frame(), use_container_width=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _csv_bytes(data_sig: tuple, _df: pd.DataFrame) -> bytes:
+    """CSV в байтах; кэшируется по сигнатуре данных (сам DataFrame не хэшируется)."""
+    # именно pandas: формат скачиваемого датасета (даты, True/False, 3.0) не должен меняться
+    return _df.to_csv(index=False).encode("utf-8")
 
 
 def prepare_csv_download(df: pd.DataFrame, original_filename: str = None):
     """
-    Готовит CSV-файл в буфере для скачивания.
-    Возвращает (file_name, buffer).
+    Готовит CSV-файл для скачивания.
+    Возвращает (file_name, csv_bytes).
     """
     base_name = "data"
     if original_filename:
@@ -231,8 +246,5 @@ def prepare_csv_download(df: pd.DataFrame, original_filename: str = None):
 
     file_name = f"{base_name}_cleaned.csv"
 
-    csv_buffer = io.BytesIO()
-    df.to_csv(csv_buffer, index=False)
-    csv_buffer.seek(0)  # сброс указателя в начало
-
-    return file_name, csv_buffer
\ No newline at end of file
+    # сигнатура считается один раз на объект DataFrame, а не на каждом rerun
+    return file_name, _csv_bytes(get_data_sig(df), df)
@@ -0,0 +1,94 @@
+import weakref
+
+import pandas as pd
+import streamlit as st
+
+
+# id(df) → (weakref на df, хэш содержимого); запись удаляется вместе с объектом
+_CONTENT_HASHES: dict = {}
+
+
+def _content_hash(df: pd.DataFrame) -> int:
+    """
+    Хэш содержимого, один раз на объект DataFrame.
+    Данные в приложении не меняются на месте — каждое изменение создаёт новый
+    DataFrame, поэтому повторный вызов для того же объекта берёт готовое значение.
+    """
+    key = id(df)
+    entry = _CONTENT_HASHES.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    value = int(pd.util.hash_pandas_object(df, index=True).sum())
+
+    def _forget(ref, key=key):
+        # id мог перейти к новому объекту — удаляем только свою запись
+        if _CONTENT_HASHES.get(key, (None,))[0] is ref:
+            del _CONTENT_HASHES[key]
+
+    _CONTENT_HASHES[key] = (weakref.ref(df, _forget), value)
+    return value
+
+
+def df_fingerprint(df: pd.DataFrame) -> tuple:
+    """
+    Сигнатура DataFrame для ключей кэша: форма, имена колонок и хэш содержимого.
+    Форма и имена берутся при каждом вызове, полный хэш — один раз на объект.
+    """
+    return (
+        df.shape,
+        tuple(map(str, df.columns)),
+        _content_hash(df),
+    )
+
+
+# hash_funcs для st.cache_data: DataFrame хэшируется по сигнатуре
+DF_HASH_FUNCS = {pd.DataFrame: df_fingerprint}
+
+
+def get_column_lists(df: pd.DataFrame) -> tuple:
+    """
+    Возвращает (all_cols, numeric_cols) для текущего DataFrame.
+    Списки считаются один раз на версию данных и хранятся в session_state,
+    чтобы не пересчитывать select_dtypes на каждом rerun.
+    """
+    ss = st.session_state
+    if ss.get("_cols_df") is not df or ss.get("_cols_index") is not df.columns:
+        ss["_cols_df"] = df
+        ss["_cols_index"] = df.columns
+        ss["_all_cols"] = list(df.columns)
+        ss["_numeric_cols"] = df.select_dtypes(include="number").columns.tolist()
+        ss["_cat_cols"] = df.select_dtypes(exclude="number").columns.tolist()
+        ss["_col_idx"] = {c: i for i, c in enumerate(ss["_all_cols"])}
+        ss["_num_idx"] = {c: i for i, c in enumerate(ss["_numeric_cols"])}
+    return ss["_all_cols"], ss["_numeric_cols"]
+
+
+def get_num_cat_cols(df: pd.DataFrame) -> tuple:
+    """Возвращает (num_cols, cat_cols) — числовые и нечисловые столбцы df."""
+    _, num_cols = get_column_lists(df)
+    return num_cols, st.session_state["_cat_cols"]
+
+
+def get_column_index_maps(df: pd.DataFrame) -> tuple:
+    """
+    Возвращает (col_idx, num_idx) — словари {столбец: позиция} для
+    восстановления индекса виджетов за O(1) вместо list.index().
+    """
+    get_column_lists(df)
+    return st.session_state["_col_idx"], st.session_state["_num_idx"]
+
+
+def get_data_sig(df: pd.DataFrame) -> tuple:
+    """
+    Сигнатура содержимого текущего DataFrame (df_fingerprint).
+    Хэш считается один раз на объект DataFrame (см. _content_hash).
+    """
+    return df_fingerprint(df)
+
+
+def data_changed() -> bool:
+    """True, если данные в сессии отличаются от загруженных пользователем."""
+    df = st.session_state.get("df")
+    if df is None:
+        return False
+    return get_data_sig(df) != st.session_state.get("_loaded_sig")
@@ -1,59 +1,112 @@
 import streamlit as st
 
-from AI_helper import chat_with_context
+from AI_helper import chat_with_context, conversation_fingerprint, remember_exchange
+
+
+@st.cache_data(ttl=3600, show_spinner=False, max_entries=256)
+def _cached_chat_reply(message: str, ctx_hash: str) -> str:
+    """Ответ ИИ на message при данном состоянии диалога; ошибки не кэшируются."""
+    reply = chat_with_context(message)
+    if reply.startswith("❌"):
+        raise RuntimeError(reply)
+    return reply
+
 
 def continue_chat(user_message):
     """Обрабатывает сообщение пользователя с учётом контекста проекта."""
     if not user_message or not isinstance(user_message, str):
         return "❌ Пустой или некорректный запрос."
 
-    return chat_with_context(user_message.strip())
+    message = user_message.strip()
+    ctx_hash = conversation_fingerprint()
+    try:
+        reply = _cached_chat_reply(message, ctx_hash)
+    except RuntimeError as e:
+        return str(e)
 
+    # ответ из кэша: запроса к API не было, история диалога не пополнилась
+    if conversation_fingerprint() == ctx_hash:
+        remember_exchange(message, reply)
+    return reply
 
-def render_message(text: str, sender: str):
-    if sender == "user":
-        cols = st.columns([1, 3])
-        with cols[1]:
-            st.markdown(
-                f"""
+
+_BUBBLE_STYLE = {
+    "user": ("rgba(0, 123, 255, 0.1)", "right", "🧑‍💻"),
+    "ai":   ("rgba(40, 167, 69, 0.1)", "left", "🤖"),
+}
+
+
+def message_html(text: str, sender: str) -> str:
+    """HTML «пузыря» сообщения."""
+    background, align, icon = _BUBBLE_STYLE["user" if sender == "user" else "ai"]
+    return f"""
                 <div style='
-                    background: rgba(0, 123, 255, 0.1);
+                    background: {background};
                     color: var(--text-color);
                     padding: 10px 14px;
                     border-radius: 12px;
-                    text-align: right;
+                    text-align: {align};
                     margin: 6px 0;
                     box-shadow: 0 1px 3px rgba(0,0,0,0.15);
                 '>
-                    🧑‍💻 {text}
+                    {icon} {text}
                 </div>
-                """,
-                unsafe_allow_html=True,
-            )
+                """
+
+
+def render_message(text: str, sender: str):
+    html = message_html(text, sender)
+    if sender == "user":
+        cols = st.columns([1, 3])
+        with cols[1]:
+            st.markdown(html, unsafe_allow_html=True)
     else:
         cols = st.columns([3, 1])
         with cols[0]:
-            st.markdown(
-                f"""
-                <div style='
-                    background: rgba(40, 167, 69, 0.1);
-                    color: var(--text-color);
-                    padding: 10px 14px;
-                    border-radius: 12px;
-                    text-align: left;
-                    margin: 6px 0;
-                    box-shadow: 0 1px 3px rgba(0,0,0,0.15);
-                '>
-                    🤖 {text}
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
+            st.markdown(html, unsafe_allow_html=True)
+
+
+
+# Сколько последних сообщений показывать; остальные — по кнопке «Показать раньше»
+CHAT_WINDOW = 50
+
+
+def _show_earlier():
+    st.session_state["chat_window"] = st.session_state.get("chat_window", CHAT_WINDOW) + CHAT_WINDOW
+
+
+@st.fragment
+def render_history():
+    """
+    Рендерит последние сообщения истории. Фрагмент: «Показать раньше»
+    перезапускает только ленту сообщений, а не всю страницу.
+    """
+    chat = get_chat()
+    start = max(0, len(chat["texts"]) - st.session_state.get("chat_window", CHAT_WINDOW))
+    if start:
+        st.button(f"⬆ Показать раньше ({start})", key="chat_show_earlier", on_click=_show_earlier)
+    for text, sender in zip(chat["texts"][start:], chat["senders"][start:]):
+        render_message(text, sender)
+
+
+def get_chat() -> dict:
+    """
+    История чата в session_state в виде параллельных списков:
+    {"texts": [...], "senders": [...]} — без отдельного dict на каждое сообщение.
+    """
+    return st.session_state.setdefault("chat", {"texts": [], "senders": []})
+
 
+def append_message(text: str, sender: str):
+    """Добавляет сообщение в историю чата."""
+    chat = get_chat()
+    chat["texts"].append(text)
+    chat["senders"].append(sender)
 
 
 def reset_chat_history():
     """
     Очищает историю чата в session_state.
     """
-    st.session_state["chat_history"] = []
\ No newline at end of file
+    st.session_state["chat"] = {"texts": [], "senders": []}
+    st.session_state.pop("chat_window", None)
\ No newline at end of file
@@ -1,5 +1,7 @@
 # modeling_helpers.py
-import pickle
+import io
+import uuid
+import joblib
 import numpy as np
 import pandas as pd
 import streamlit as st
@@ -11,14 +13,14 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
 from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import (
-    accuracy_score, precision_score, recall_score, f1_score, roc_auc_score,
-    roc_curve, precision_recall_curve
-)
+from sklearn.metrics import roc_auc_score, roc_curve, precision_recall_curve
 
 import plotly.express as px
 import plotly.graph_objects as go
 
+from Utils.cache_utils import DF_HASH_FUNCS
+from Utils.upload_utils import write_csv_fast
+
 # =========================
 # Внутренние утилиты
 # =========================
@@ -30,37 +32,33 @@ def get_ns(name: str) -> dict:
 
 def build_preprocessor(num_cols: List[str], cat_cols: List[str]) -> ColumnTransformer:
     """Строит препроцессор для числовых и категориальных фич."""
-    numeric_transformer = StandardScaler(with_mean=False)
-    categorical_transformer = OneHotEncoder(handle_unknown='ignore', sparse_output=True)
+    # X уже собственная float32-копия (prepare_features_and_target) — масштабируем на месте
+    numeric_transformer = StandardScaler(with_mean=False, copy=False)
+    categorical_transformer = OneHotEncoder(handle_unknown='ignore', sparse_output=True, dtype=np.float32)
     return ColumnTransformer(
         transformers=[
             ('num', numeric_transformer, num_cols),
             ('cat', categorical_transformer, cat_cols),
         ],
-        remainder='drop'
+        remainder='drop',
+        # при наличии OHE-части результат всегда остаётся разреженным (CSR), даже если
+        # плотность выше порога по умолчанию 0.3 — все решатели LogisticRegression работают с CSR напрямую
+        sparse_threshold=1.0
     )
 
 def transformed_name_maps(preprocessor: ColumnTransformer) -> Tuple[Dict[str, str], Dict[str, str]]:
     """Возвращает полные и базовые имена признаков после трансформации."""
     names = preprocessor.get_feature_names_out()
-    full_map, base_map = {}, {}
-    for name in names:
-        if name.startswith('num__'):
-            orig = name.split('num__', 1)[1]
-            full_map[name] = orig
-            base_map[name] = orig
-        elif name.startswith('cat__'):
-            tail = name.split('cat__', 1)[1]
-            if '_' in tail:
-                base, val = tail.split('_', 1)
-                full_map[name] = f"{base}_{val}"
-                base_map[name] = base
-            else:
-                full_map[name] = tail
-                base_map[name] = tail
-        else:
-            full_map[name] = name
-            base_map[name] = name
+    # один векторный проход вместо startswith/split на каждое имя
+    s = pd.Series(names, dtype=object)
+    prefix = s.str.slice(0, 5)
+    tail = s.str.slice(5)
+    known = prefix.isin(["num__", "cat__"]).to_numpy()
+    # num__x → x; cat__x_val → полное «x_val», базовое — до первого «_»; прочие — как есть
+    full = np.where(known, tail, s)
+    base = np.where((prefix == "cat__").to_numpy(), tail.str.split("_", n=1).str[0], full)
+    full_map = dict(zip(names, full))
+    base_map = dict(zip(names, base))
     return full_map, base_map
 
 # =========================
@@ -76,15 +74,45 @@ def split_features_by_type(df: pd.DataFrame, feature_cols: List[str]) -> Tuple[L
     cat_cols = [c for c in feature_cols if not pd.api.types.is_numeric_dtype(df[c])]
     return num_cols, cat_cols
 
+@st.cache_data(show_spinner=False, hash_funcs=DF_HASH_FUNCS, max_entries=4)
 def prepare_features_and_target(df: pd.DataFrame, target_col: str):
-    """Делит фичи и таргет, кодирует y в числа."""
+    """
+    Делит фичи и таргет, кодирует y в числа.
+    Кэшируется по (данные, таргет): переобучение с другими C/penalty не кодирует y заново.
+    """
     y = df[target_col]
     X = df.drop(columns=[target_col])
     le = LabelEncoder()
     y_encoded = le.fit_transform(y)
     num_cols, cat_cols = split_features_by_type(X, X.columns.tolist())
+    if num_cols:
+        # float32: вдвое меньше памяти под закодированную матрицу; liblinear работает с ней без
+        # преобразования обратно в float64, а OneHotEncoder тоже выдаёт float32
+        X = X.astype({c: np.float32 for c in num_cols})
     return X, y_encoded, le, num_cols, cat_cols
 
+@st.cache_data(show_spinner=False, hash_funcs=DF_HASH_FUNCS, max_entries=4)
+def split_train_test(df: pd.DataFrame, target_col: str, test_size: float):
+    """
+    Стратифицированное разбиение train/test.
+    Кэшируется по (данные, таргет, test_size): смена C/penalty/порога не делит выборку заново.
+    """
+    X, y_encoded, le, num_cols, cat_cols = prepare_features_and_target(df, target_col)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y_encoded, test_size=test_size, random_state=42, stratify=y_encoded
+    )
+    return X_train, X_test, y_train, y_test, le
+
+@st.cache_resource(show_spinner=False, hash_funcs=DF_HASH_FUNCS, max_entries=4)
+def fit_preprocessor(X_train: pd.DataFrame, num_cols: Tuple[str, ...], cat_cols: Tuple[str, ...]):
+    """
+    Обучает ColumnTransformer и возвращает (препроцессор, преобразованный X_train).
+    Объект общий для всех моделей на этих данных — дальше он только transform'ит, не переобучается.
+    """
+    preprocessor = build_preprocessor(list(num_cols), list(cat_cols))
+    X_train_t = preprocessor.fit_transform(X_train)
+    return preprocessor, X_train_t
+
 # =========================
 # Липкое состояние
 # =========================
@@ -139,62 +167,146 @@ def mark_model_trained():
 # =========================
 # Обучение и оценка
 # =========================
-def train_logistic_regression(
+# с этого размера обучающей выборки liblinear заменяется на saga/lbfgs
+LARGE_TRAIN_ROWS = 100_000
+
+def choose_solver(penalty: str, n_samples: int) -> str:
+    """
+    Решатель под регуляризацию и размер выборки.
+    До LARGE_TRAIN_ROWS строк — liblinear, как раньше (он штрафует и свободный член,
+    поэтому на малых данных модели и метрики не меняются). На больших выборках:
+    l1 — saga, l2 — lbfgs; оба работают с CSR и делают меньше проходов по данным.
+    """
+    if n_samples < LARGE_TRAIN_ROWS:
+        return "liblinear"
+    return "saga" if penalty == "l1" else "lbfgs"
+
+@st.cache_resource(show_spinner=False, hash_funcs=DF_HASH_FUNCS, max_entries=8)
+def _fit_logistic_regression(
     X_train: pd.DataFrame, y_train: np.ndarray,
-    C: float = 1.0, penalty: str = "l2",
-    class_weight: Optional[str] = None, max_iter: int = 1000,
-    label_encoder: Optional[LabelEncoder] = None
+    C: float, penalty: str, class_weight: Optional[str], max_iter: int
 ) -> Tuple[Pipeline, Dict]:
-    """Тренирует пайплайн препроцессор + логистическая регрессия."""
+    """
+    Обучение пайплайна, кэшируется по (X_train, y_train, гиперпараметры):
+    повторное обучение с уже пробованными настройками возвращает готовую модель.
+    Модель и meta общие для всех сессий — не изменять.
+    """
     feature_cols = list(X_train.columns)
     num_cols, cat_cols = split_features_by_type(X_train, feature_cols)
-    preprocessor = build_preprocessor(num_cols, cat_cols)
+    preprocessor, X_train_t = fit_preprocessor(X_train, tuple(num_cols), tuple(cat_cols))
     clf = LogisticRegression(
-        C=C, penalty=penalty, solver='liblinear',
+        C=C, penalty=penalty, solver=choose_solver(penalty, X_train_t.shape[0]),
+        # на больших выборках допуск 1e-3: итераций заметно меньше при той же точности метрик
+        tol=1e-3 if X_train_t.shape[0] >= LARGE_TRAIN_ROWS else 1e-4,
         max_iter=max_iter, class_weight=class_weight
     )
+    clf.fit(X_train_t, y_train)
     model = Pipeline([('preprocessor', preprocessor), ('clf', clf)])
-    model.fit(X_train, y_train)
     full_map, base_map = transformed_name_maps(preprocessor)
+    transformed_names = preprocessor.get_feature_names_out()
+    # номер исходного признака для каждого преобразованного столбца (в порядке появления)
+    # base_map построен по get_feature_names_out в том же порядке — значения берутся без поиска по ключам
+    base_idx, unique_bases = pd.factorize(np.fromiter(base_map.values(), dtype=object, count=len(base_map)))
     meta = {
         "feature_cols": feature_cols,
         "num_cols": num_cols,
         "cat_cols": cat_cols,
-        "transformed_names": preprocessor.get_feature_names_out(),
+        "transformed_names": transformed_names,
         "feature_full_map": full_map,
         "feature_base_map": base_map,
-        "label_encoder": label_encoder
+        "base_idx": base_idx,
+        "unique_bases": list(unique_bases),
+        "row_index": build_row_index(preprocessor, num_cols, cat_cols),
     }
     return model, meta
 
+def train_logistic_regression(
+    X_train: pd.DataFrame, y_train: np.ndarray,
+    C: float = 1.0, penalty: str = "l2",
+    class_weight: Optional[str] = None, max_iter: int = 1000,
+    label_encoder: Optional[LabelEncoder] = None
+) -> Tuple[Pipeline, Dict]:
+    """
+    Тренирует пайплайн препроцессор + логистическая регрессия.
+    Препроцессор берётся из кэша (fit_preprocessor), заново обучается только классификатор.
+    LabelEncoder streamlit не хэширует; на обучение он не влияет (в ключе кэша уже
+    закодированный y_train), поэтому добавляется в свою копию meta вне кэша.
+    """
+    model, meta = _fit_logistic_regression(X_train, y_train, C, penalty, class_weight, max_iter)
+    return model, {**meta, "label_encoder": label_encoder}
+
+def build_row_index(preprocessor: ColumnTransformer, num_cols: List[str], cat_cols: List[str]) -> Dict[str, object]:
+    """
+    Таблицы для кодирования одной строки без ColumnTransformer.transform:
+      num_pos / num_scale — позиции числовых столбцов и делители StandardScaler (with_mean=False)
+      cat_pos — {признак: {категория-строка: позиция one-hot столбца}}
+    """
+    out = preprocessor.output_indices_
+    index = {"num_cols": list(num_cols), "num_pos": np.arange(out["num"].start, out["num"].stop), "cat_pos": {}}
+    index["num_scale"] = preprocessor.named_transformers_["num"].scale_ if num_cols else np.empty(0)
+    if cat_cols:
+        start = out["cat"].start
+        for col, cats in zip(cat_cols, preprocessor.named_transformers_["cat"].categories_):
+            index["cat_pos"][col] = {str(c): start + i for i, c in enumerate(cats)}
+            start += len(cats)
+    return index
+
+def encode_single_row(row_index: Dict[str, object], row: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Разреженное представление одной строки: (позиции, значения) ненулевых признаков.
+    Совпадает с preprocessor.transform; неизвестные категории пропускаются (handle_unknown='ignore').
+    """
+    num_vals = row[row_index["num_cols"]].to_numpy(dtype=np.float64) / row_index["num_scale"]
+    cat_idx = []
+    for col, pos in row_index["cat_pos"].items():
+        j = pos.get(str(row[col]))
+        if j is not None:
+            cat_idx.append(j)
+    idx = np.concatenate([row_index["num_pos"], np.asarray(cat_idx, dtype=np.intp)])
+    vals = np.concatenate([num_vals, np.ones(len(cat_idx))])
+    return idx, vals
+
+def threshold_metrics(y_true: np.ndarray, y_proba: np.ndarray, threshold: float) -> Dict[str, float]:
+    """
+    Accuracy / Precision / Recall / F1 при заданном пороге по матрице ошибок.
+    Кривые и ROC-AUC от порога не зависят, поэтому при смене порога пересчитывается только это.
+    """
+    # код ячейки матрицы ошибок: 2·истина + прогноз → tn=0, fp=1, fn=2, tp=3; один bincount
+    codes = (y_true == 1).view(np.int8) * 2 + (y_proba >= threshold).view(np.int8)
+    tn, fp, fn, tp = (int(v) for v in np.bincount(codes, minlength=4))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "Accuracy": (tp + tn) / len(y_true) if len(y_true) else 0.0,
+        "Precision": precision,
+        "Recall": recall,
+        "F1-score": f1,
+    }
+
 def evaluate_model(model: Pipeline, X_test: pd.DataFrame, y_test: np.ndarray, meta: Dict, threshold: float = 0.5):
-    """Считает метрики и кривые ROC/PR."""
+    """Считает метрики и кривые ROC/PR. Возвращает также y_test и вероятности для смены порога."""
     y_proba = model.predict_proba(X_test)[:, 1]
-    y_pred_int = (y_proba >= threshold).astype(int)
     le = meta.get("label_encoder")
-    if le is not None and np.array(y_test).dtype.kind in ("U", "S", "O"):
-        y_pred = le.inverse_transform(y_pred_int)
-    else:
-        y_pred = y_pred_int
-    metrics = {
-        "Accuracy": accuracy_score(y_test, y_pred),
-        "Precision": precision_score(y_test, y_pred, zero_division=0),
-        "Recall": recall_score(y_test, y_pred, zero_division=0),
-        "F1-score": f1_score(y_test, y_pred, zero_division=0),
-        "ROC-AUC": roc_auc_score(
-            le.transform(y_test) if le and np.array(y_test).dtype.kind in ("U", "S", "O") else y_test,
-            y_proba
-        )
-    }
-    fpr, tpr, _ = roc_curve(
-        le.transform(y_test) if le and np.array(y_test).dtype.kind in ("U", "S", "O") else y_test,
-        y_proba
-    )
-    precision, recall, _ = precision_recall_curve(
-        le.transform(y_test) if le and np.array(y_test).dtype.kind in ("U", "S", "O") else y_test,
-        y_proba
-            )
-    return metrics, (fpr, tpr), (precision, recall)
+    # np.asarray без копии для готового ndarray; тип смотрится по нему же
+    y_arr = np.asarray(y_test)
+    y_true = le.transform(y_arr) if le is not None and y_arr.dtype.kind in ("U", "S", "O") else y_arr
+    metrics = threshold_metrics(y_true, y_proba, threshold)
+    metrics["ROC-AUC"] = roc_auc_score(y_true, y_proba)
+    fpr, tpr, _ = roc_curve(y_true, y_proba)
+    precision, recall, _ = precision_recall_curve(y_true, y_proba)
+    # метки сжимаются до int8 без потерь; вероятности остаются float64 — те же, по которым
+    # посчитаны метрики выше, иначе при том же пороге apply_threshold мог бы дать другой результат
+    return metrics, (fpr, tpr), (precision, recall), (y_true.astype(np.int8), y_proba)
+
+def apply_threshold(data: dict, threshold: float) -> None:
+    """Пересчитывает пороговые метрики обученной модели без переобучения (ROC-AUC и кривые не меняются)."""
+    if data.get("threshold") == threshold or "y_proba" not in data:
+        return
+    metrics = threshold_metrics(data["y_test"], data["y_proba"], threshold)
+    metrics["ROC-AUC"] = data["metrics"]["ROC-AUC"]
+    data["metrics"] = metrics
+    data["threshold"] = threshold
 
 # =========================
 # Важность признаков и интерпретация
@@ -203,29 +315,23 @@ def compute_feature_importance(model: Pipeline, meta: Dict) -> pd.DataFrame:
     """Агрегирует важности с учётом one-hot."""
     lr = model.named_steps['clf']
     coefs = lr.coef_[0]
-    tnames = meta["transformed_names"]
-    base_map = meta["feature_base_map"]
-    full_map = meta["feature_full_map"]
-
-    df = pd.DataFrame({
-        "Transformed": tnames,
-        "Coefficient": coefs,
-        "OriginalFeature": [base_map[name] for name in tnames],
-        "FullFeatureName": [full_map[name] for name in tnames]
+    base_idx = meta["base_idx"]
+    bases = np.asarray(meta["unique_bases"], dtype=object)
+
+    # группы one-hot фиксированы при обучении: суммы по исходному признаку — два bincount
+    coef_sum = np.bincount(base_idx, weights=coefs, minlength=len(bases))
+    abs_sum = np.bincount(base_idx, weights=np.abs(coefs), minlength=len(bases))
+    sign = np.where(coef_sum > 0, "Положительное", np.where(coef_sum < 0, "Отрицательное", "Слабое"))
+    order = np.argsort(-abs_sum, kind="stable")
+
+    return pd.DataFrame({
+        "Feature": bases[order],
+        "Coefficient": coef_sum[order],
+        "AbsCoefficient": abs_sum[order],
+        "Sign": sign[order],
     })
 
-    agg = df.groupby("OriginalFeature").agg(
-        Coefficient=("Coefficient", "sum"),
-        AbsCoefficient=("Coefficient", lambda x: np.sum(np.abs(x)))
-    ).reset_index()
-
-    agg["Sign"] = np.where(
-        agg["Coefficient"] > 0, "Положительное",
-        np.where(agg["Coefficient"] < 0, "Отрицательное", "Слабое")
-    )
-
-    return agg.rename(columns={"OriginalFeature": "Feature"}).sort_values("AbsCoefficient", ascending=False)
-
+@st.cache_data(show_spinner=False, hash_funcs=DF_HASH_FUNCS)
 def plot_feature_importance(importance_df: pd.DataFrame):
     """Горизонтальный barplot по абсолютной важности."""
     fig = px.bar(
@@ -255,6 +361,7 @@ def interpret_feature_importance(importance_df: pd.DataFrame, top_n: int = 3) ->
         parts.append("Сильных влияющих признаков не обнаружено в топе.")
     return " ".join(parts)
 
+@st.cache_data(show_spinner=False)
 def make_roc_fig(fpr, tpr):
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=fpr, y=tpr, mode='lines', name='ROC'))
@@ -262,6 +369,7 @@ def make_roc_fig(fpr, tpr):
     fig.update_layout(title="ROC-кривая", xaxis_title="FPR", yaxis_title="TPR")
     return fig
 
+@st.cache_data(show_spinner=False)
 def make_pr_fig(precision, recall):
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=recall, y=precision, mode='lines', name='PR'))
@@ -271,56 +379,86 @@ def make_pr_fig(precision, recall):
 # =========================
 # Прогноз для одного объекта
 # =========================
-def validate_and_prepare_single_input(df: pd.DataFrame, feature_cols: List[str], user_input: Dict[str, object]) -> Tuple[Optional[pd.DataFrame], Dict[str, str]]:
-    """Проверяет значения и формирует DataFrame из одного объекта."""
+def build_input_validation(df: pd.DataFrame, feature_cols: List[str]) -> dict:
+    """
+    Данные для проверки ввода, считаются при обучении (см. prepare_prediction_form):
+      is_numeric — {признак: числовой ли столбец}
+      allowed    — {категориальный признак: frozenset допустимых значений-строк}
+    """
+    # типы берутся из df.dtypes одним проходом, без выборки столбца на каждый признак
+    dtypes = df.dtypes.map(pd.api.types.is_numeric_dtype).to_dict()
+    is_numeric = {c: dtypes[c] for c in feature_cols}
+    allowed = {c: frozenset(_cat_options(df[c], limit=None)) for c in feature_cols if not is_numeric[c]}
+    return {"is_numeric": is_numeric, "allowed": allowed}
+
+def validate_and_prepare_single_input(validation: dict, feature_cols: List[str], user_input: Dict[str, object]) -> Tuple[Optional[pd.DataFrame], Dict[str, str]]:
+    """Проверяет значения по данным build_input_validation и формирует DataFrame из одного объекта."""
     errors, row = {}, {}
+    num_feats = []
     for feat in feature_cols:
         if feat not in user_input:
             errors[feat] = "Поле отсутствует."
             continue
         val = user_input[feat]
-        series = df[feat]
-        if pd.api.types.is_numeric_dtype(series):
-            try:
-                if val is None or (isinstance(val, str) and val.strip() == ""):
-                    errors[feat] = "Числовое значение не задано."
-                else:
-                    row[feat] = float(val)
-            except Exception:
-                errors[feat] = f"Ожидалось число, получено: {val}"
+        if validation["is_numeric"][feat]:
+            if val is None or (isinstance(val, str) and val.strip() == ""):
+                errors[feat] = "Числовое значение не задано."
+            else:
+                num_feats.append(feat)
         else:
-            allowed = pd.Series(series.dropna().unique()).astype(str).tolist()
+            allowed = validation["allowed"][feat]
             sval = str(val)
             if sval not in allowed:
-                errors[feat] = f"Недопустимая категория: {sval}. Допустимые: {', '.join(allowed[:20])}" + (" ..." if len(allowed) > 20 else "")
+                # список-подсказка собирается только при ошибке
+                preview = sorted(allowed)[:20]
+                errors[feat] = f"Недопустимая категория: {sval}. Допустимые: {', '.join(preview)}" + (" ..." if len(allowed) > 20 else "")
             else:
                 row[feat] = sval
+    if num_feats:
+        # все числовые значения приводятся одним векторным вызовом
+        raw = pd.Series([user_input[f] for f in num_feats], dtype=object)
+        nums = pd.to_numeric(raw, errors="coerce").to_numpy(dtype=np.float64)
+        bad = np.isnan(nums)
+        for feat, val in zip(np.asarray(num_feats, dtype=object)[bad], raw[bad]):
+            errors[feat] = f"Ожидалось число, получено: {val}"
+        row.update(zip(num_feats, nums.tolist()))
     if errors:
         return None, errors
     return pd.DataFrame([row], columns=feature_cols), {}
 
 def predict_with_explanation(model: Pipeline, meta: Dict, X_input_df: pd.DataFrame, threshold: float = 0.5, top_k: int = 3) -> Dict[str, object]:
     """Предсказание для одного объекта с объяснением."""
-    proba = float(model.predict_proba(X_input_df)[0, 1])
-    pred_class_int = int(proba >= threshold)
-    le = meta.get("label_encoder")
-    pred_class = le.inverse_transform([pred_class_int])[0] if le is not None else pred_class_int
-
+    # препроцессинг выполняется один раз: и для вероятности, и для вкладов признаков
     preproc = model.named_steps['preprocessor']
     lr = model.named_steps['clf']
-    x_trans = preproc.transform(X_input_df)
-    x_vec = x_trans.toarray()[0] if hasattr(x_trans, "toarray") else np.asarray(x_trans)[0]
     w = lr.coef_[0]
-    contrib_transformed = x_vec * w
+    if "row_index" in meta:
+        # одна строка кодируется по таблицам из обучения, минуя диспетчеризацию ColumnTransformer
+        idx, vals = encode_single_row(meta["row_index"], X_input_df.iloc[0])
+    else:
+        x_trans = preproc.transform(X_input_df)
+        if hasattr(x_trans, "tocsr"):
+            # строка не уплотняется: вклады только по k ненулевым признакам, O(k) вместо O(d)
+            row = x_trans.tocsr()
+            idx, vals = row.indices, row.data
+        else:
+            idx, vals = np.arange(w.shape[0]), np.asarray(x_trans)[0]
+    contrib = vals * w[idx]
 
-    tnames = meta["transformed_names"]
-    base_map = meta["feature_base_map"]
-    grouped = {}
-    for val, tname in zip(contrib_transformed, tnames):
-        base = base_map[tname]
-        grouped[base] = grouped.get(base, 0.0) + float(val)
+    # Для бинарной логрегрессии predict_proba[:, 1] = sigmoid(w·x + b); вклады уже
+    # посчитаны, поэтому вероятность — их сумма плюс смещение, без вызова predict_proba
+    z = float(contrib.sum() + lr.intercept_[0])
+    proba = float(1.0 / (1.0 + np.exp(-z)))
+    pred_class_int = int(proba >= threshold)
+    le = meta.get("label_encoder")
+    pred_class = le.inverse_transform([pred_class_int])[0] if le is not None else pred_class_int
 
-    top = sorted(grouped.items(), key=lambda kv: abs(kv[1]), reverse=True)[:top_k]
+    # сумма вкладов по исходным признакам одним bincount; стабильная сортировка
+    # сохраняет порядок признаков при равных по модулю вкладах
+    unique_bases = meta["unique_bases"]
+    grouped = np.bincount(meta["base_idx"][idx], weights=contrib, minlength=len(unique_bases))
+    order = np.argsort(-np.abs(grouped), kind="stable")[:top_k]
+    top = [(unique_bases[i], float(grouped[i])) for i in order]
     influence_text = ", ".join([f"{feat} ({'+' if v > 0 else ''}{v:.2f})" for feat, v in top])
     explanation = f"Решение объясняется вкладом признаков: {influence_text}."
     return {
@@ -335,7 +473,32 @@ def predict_with_explanation(model: Pipeline, meta: Dict, X_input_df: pd.DataFra
 # Экспорт и отчёт
 # =========================
 def serialize_model(model: Pipeline) -> bytes:
-    return pickle.dumps(model)
+    """
+    Модель в байтах через joblib: массивы numpy пишутся отдельными буферами (protocol 5)
+    и сжимаются lz4; если lz4 не установлен — zlib.
+    """
+    buf = io.BytesIO()
+    try:
+        joblib.dump(model, buf, compress=("lz4", 3), protocol=5)
+    except ValueError:
+        buf = io.BytesIO()
+        joblib.dump(model, buf, compress=3, protocol=5)
+    return buf.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def serialize_model_cached(model_id: str, _model: Pipeline) -> bytes:
+    """Байты модели, кэшированные по model_id (сама модель не хэшируется)."""
+    return serialize_model(_model)
+
+@st.cache_data(show_spinner=False, hash_funcs=DF_HASH_FUNCS)
+def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """CSV-байты DataFrame; пересчитываются только при изменении данных."""
+    return write_csv_fast(df)
+
+@st.cache_data(show_spinner=False)
+def metrics_to_csv_bytes(metrics_items: Tuple[Tuple[str, float], ...]) -> bytes:
+    """CSV-байты метрик (одна строка); ключ кэша — кортеж пар (метрика, значение)."""
+    return write_csv_fast(pd.DataFrame([dict(metrics_items)]))
 
 def generate_markdown_report(target_col: str, metrics: Dict[str, float], importance_df: pd.DataFrame, threshold: float, model_params: Dict[str, object], top_n: int = 10) -> str:
     lines = [
@@ -351,10 +514,18 @@ def generate_markdown_report(target_col: str, metrics: Dict[str, float], importa
     lines.append("")
     lines.append("## Топ признаков")
     top = importance_df.head(top_n)
-    for _, r in top.iterrows():
-        lines.append(f"- {r['Feature']}: coef={r['Coefficient']:.4f}, |coef|={r['AbsCoefficient']:.4f}, знак={r['Sign']}")
+    # itertuples не создаёт pd.Series на каждую строку, в отличие от iterrows
+    for r in top[["Feature", "Coefficient", "AbsCoefficient", "Sign"]].itertuples(index=False):
+        lines.append(f"- {r.Feature}: coef={r.Coefficient:.4f}, |coef|={r.AbsCoefficient:.4f}, знак={r.Sign}")
     return "\n".join(lines)
 
+@st.cache_data(show_spinner=False, hash_funcs=DF_HASH_FUNCS)
+def report_md_bytes(target_col: str, metrics_items: tuple, importance_df: pd.DataFrame, threshold: float, params_items: tuple, top_n: int = 10) -> bytes:
+    """Markdown-отчёт в байтах; пересобирается только при изменении входных данных."""
+    return generate_markdown_report(
+        target_col, dict(metrics_items), importance_df, threshold, dict(params_items), top_n
+    ).encode("utf-8")
+
 
 def show_model_settings():
     with st.expander("⚙️ Настройки модели", expanded=False):
@@ -370,26 +541,26 @@ def show_model_settings():
     return C_value, penalty, max_iter, threshold, test_size, use_class_weight
 
 def train_and_save_model(df, target_col, C_value, penalty, max_iter, threshold, test_size, use_class_weight):
-    X, y_encoded, le, num_cols, cat_cols = prepare_features_and_target(df, target_col)
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y_encoded, test_size=test_size, random_state=42, stratify=y_encoded
-    )
+    X_train, X_test, y_train, y_test, le = split_train_test(df, target_col, test_size)
     class_weight = "balanced" if use_class_weight else None
     model, meta = train_logistic_regression(
         X_train, y_train, C=C_value, penalty=penalty,
         class_weight=class_weight, max_iter=max_iter,
         label_encoder=le
     )
-    metrics, roc_data, pr_data = evaluate_model(model, X_test, y_test, meta, threshold)
+    metrics, roc_data, pr_data, (y_true, y_proba) = evaluate_model(model, X_test, y_test, meta, threshold)
     importance_df = compute_feature_importance(model, meta)
     short_text = interpret_feature_importance(importance_df, top_n=3)
     st.session_state["modeling"] = {
         "model": model, "meta": meta,
+        "model_id": uuid.uuid4().hex,
         "threshold": threshold, "metrics": metrics,
         "roc": roc_data, "pr": pr_data,
+        "y_test": y_true, "y_proba": y_proba,
         "importance_df": importance_df, "short_text": short_text,
         "target_col": target_col,
         "feature_cols": [c for c in df.columns if c != target_col],
+        "prediction_form": prepare_prediction_form(df, [c for c in df.columns if c != target_col]),
         "params": {
             "C": C_value, "penalty": penalty,
             "class_weight": class_weight, "max_iter": max_iter,
@@ -401,11 +572,11 @@ def train_and_save_model(df, target_col, C_value, penalty, max_iter, threshold,
 def show_results_and_analysis(data):
     st.subheader("📊 Результаты и анализ")
     with st.expander("Показать метрики и кривые", expanded=False):
-        m_df = pd.DataFrame({
-            "Метрика": list(data["metrics"].keys()),
-            "Значение": [round(v, 4) for v in data["metrics"].values()]
-        })
-        st.dataframe(m_df, use_container_width=True, hide_index=True)
+        # числовой столбец float32 + категориальный индекс: Arrow-кодирование без object-колонок
+        metrics = data["metrics"]
+        vals = np.fromiter(metrics.values(), dtype=np.float32, count=len(metrics)).round(4)
+        m_df = pd.DataFrame({"Значение": vals}, index=pd.CategoricalIndex(list(metrics), name="Метрика"))
+        st.dataframe(m_df, use_container_width=True)
         fpr, tpr = data["roc"]
         precision, recall = data["pr"]
         c1, c2 = st.columns(2)
@@ -417,25 +588,68 @@ def show_results_and_analysis(data):
     st.plotly_chart(plot_feature_importance(data["importance_df"]), use_container_width=True)
     st.info(data["short_text"])
 
-def show_single_prediction(data, df):
+def _cat_options(series: pd.Series, limit: Optional[int] = 300) -> List[str]:
+    """
+    Отсортированные уникальные значения категориального признака как строки.
+    unique считается по сырому массиву, NaN отбрасываются уже среди уникальных.
+    """
+    arr = np.asarray(pd.unique(series.to_numpy()), dtype=object)
+    arr = arr[~pd.isna(arr)].astype(str)
+    arr.sort()  # сортировка numpy на месте — без Python-сравнений и лишней копии
+    return arr[:limit].tolist()
+
+def feature_input_stats(df: pd.DataFrame, num_cols: List[str], cat_cols: List[str]):
+    """
+    Метаданные для формы прогноза:
+      num_stats   — {признак: (min, max, median)}
+      cat_options — {признак: отсортированные уникальные значения (до 300)}
+    """
+    num_stats = {}
+    if num_cols:
+        # один проход agg вместо трёх отдельных сканов на каждый признак
+        agg = df[list(num_cols)].agg(["min", "max", "median"]).astype(float)
+        num_stats = {
+            feat: (agg.at["min", feat], agg.at["max", feat], agg.at["median", feat])
+            for feat in num_cols
+        }
+    cat_options = {}
+    for feat in cat_cols:
+        cat_options[feat] = _cat_options(df[feat]) or ["(пусто)"]
+    return num_stats, cat_options
+
+def prepare_prediction_form(df: pd.DataFrame, feature_cols: List[str]) -> dict:
+    """
+    Всё, что нужно форме прогноза, считается один раз при обучении и хранится
+    в st.session_state["modeling"] — фрагмент формы не трогает df на каждом тике.
+    """
+    num_cols, cat_cols = split_features_by_type(df, feature_cols)
+    num_stats, cat_options = feature_input_stats(df, num_cols, cat_cols)
+    return {
+        "num_cols": num_cols, "cat_cols": cat_cols,
+        "num_stats": num_stats, "cat_options": cat_options,
+        "validation": build_input_validation(df, feature_cols),
+    }
+
+# Фрагмент: ввод значений и кнопка прогноза перезапускают только эту форму, а не всю страницу
+@st.fragment
+def show_single_prediction(data):
     with st.expander("🔍 Прогноз для одного объекта", expanded=False):
-        num_cols, cat_cols = split_features_by_type(df, data["feature_cols"])
+        form = data["prediction_form"]
         user_input = {}
         cols = st.columns(3) if len(data["feature_cols"]) >= 9 else (st.columns(2) if len(data["feature_cols"]) >= 4 else st.columns(1))
-        all_feats = num_cols + cat_cols
+        all_feats = form["num_cols"] + form["cat_cols"]
+        num_stats, cat_options = form["num_stats"], form["cat_options"]
         for i, feat in enumerate(all_feats):
             with cols[i % len(cols)]:
-                series = df[feat]
-                if pd.api.types.is_numeric_dtype(series):
-                    vmin, vmax, vdefault = float(series.min()), float(series.max()), float(series.median())
+                if feat in num_stats:
+                    vmin, vmax, vdefault = num_stats[feat]
                     user_input[feat] = st.number_input(f"{feat}", min_value=vmin if np.isfinite(vmin) else None,
                                                        max_value=vmax if np.isfinite(vmax) else None,
                                                        value=vdefault if np.isfinite(vdefault) else 0.0)
                 else:
-                    options = sorted(pd.Series(series.dropna().unique()).astype(str).tolist())[:300] or ["(пусто)"]
-                    user_input[feat] = st.selectbox(f"{feat}", options, index=0)
+                    user_input[feat] = st.selectbox(f"{feat}", cat_options[feat], index=0)
         if st.button("Сделать прогноз"):
-            X_input_df, errors = validate_and_prepare_single_input(df, data["feature_cols"], user_input)
+            X_input_df, errors = validate_and_prepare_single_input(form["validation"], data["feature_cols"], user_input)
             if errors:
                 for k, msg in errors.items():
                     st.warning(f"{k}: {msg}")
@@ -447,23 +661,24 @@ def show_single_prediction(data, df):
                 st.success(f"Предсказанный класс: {result['pred_class']}")
                 st.write(result["explanation"])
 
+@st.fragment
 def show_export_buttons(data):
     with st.expander("📦 Экспорт", expanded=False):
         cdl1, cdl2, cdl3, cdl4 = st.columns(4)
         with cdl1:
-            model_bytes = serialize_model(data["model"])
-            st.download_button("Скачать модель (.pkl)", data=model_bytes, file_name="logreg_model.pkl", mime="application/octet-stream", use_container_width=True)
+            model_id = data.get("model_id")
+            model_bytes = serialize_model_cached(model_id, data["model"]) if model_id else serialize_model(data["model"])
+            st.download_button("Скачать модель (.joblib)", data=model_bytes, file_name="logreg_model.joblib", mime="application/octet-stream", use_container_width=True)
         with cdl2:
-            imp_csv = data["importance_df"].to_csv(index=False).encode("utf-8")
+            imp_csv = df_to_csv_bytes(data["importance_df"])
             st.download_button("Скачать важности (CSV)", data=imp_csv, file_name="feature_importance.csv", mime="text/csv", use_container_width=True)
         with cdl3:
-            metrics_df = pd.DataFrame([data["metrics"]])
-            metr_csv = metrics_df.to_csv(index=False).encode("utf-8")
+            metr_csv = metrics_to_csv_bytes(tuple(data["metrics"].items()))
             st.download_button("Скачать метрики (CSV)", data=metr_csv, file_name="metrics.csv", mime="text/csv", use_container_width=True)
         with cdl4:
-            md = generate_markdown_report(
-                target_col=data["target_col"], metrics=data["metrics"],
+            md_bytes = report_md_bytes(
+                target_col=data["target_col"], metrics_items=tuple(data["metrics"].items()),
                 importance_df=data["importance_df"], threshold=data["threshold"],
-                model_params=data["params"], top_n=10
+                params_items=tuple(data["params"].items()), top_n=10
             )
-            st.download_button("Скачать отчёт (MD)", data=md.encode("utf-8"), file_name="model_report.md", mime="text/markdown", use_container_width=True)
\ No newline at end of file
+            st.download_button("Скачать отчёт (MD)", data=md_bytes, file_name="model_report.md", mime="text/markdown", use_container_width=True)
\ No newline at end of file
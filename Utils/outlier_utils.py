@@ -6,6 +6,8 @@ import plotly.graph_objects as go
 from typing import Dict, List
 from scipy.stats import skew
 
+from Utils.cache_utils import DF_HASH_FUNCS
+
 import streamlit as st
 
 def render_outlier_handling_info():
@@ -31,16 +33,11 @@ def detect_outliers_iqr(df: pd.DataFrame,
     Идентифицирует выбросы методом IQR.
     Возвращает dict: {column: boolean Series}, True там, где выброс.
     """
-    masks = {}
-    for col in cols:
-        series = df[col].dropna()
-        Q1 = series.quantile(q_low)
-        Q3 = series.quantile(q_high)
-        IQR = Q3 - Q1
-        lower = Q1 - 1.5 * IQR
-        upper = Q3 + 1.5 * IQR
-        masks[col] = (df[col] < lower) | (df[col] > upper)
-    return masks
+    sub = df[cols]
+    lower, upper = _iqr_bounds(df, cols, q_low, q_high)
+    # одна векторная проверка по всем столбцам, затем раскладываем по колонкам
+    outlier = sub.lt(lower) | sub.gt(upper)
+    return {col: outlier[col] for col in cols}
 
 
 def detect_outliers_zscore(df: pd.DataFrame,
@@ -50,27 +47,40 @@ def detect_outliers_zscore(df: pd.DataFrame,
     Идентифицирует выбросы по Z-score.
     Возвращает dict: {column: boolean Series}, True там, где |z| > z_thresh.
     """
-    masks = {}
-    for col in cols:
-        series = df[col]
-        mu = series.mean()
-        sigma = series.std()
-        # избегаем деления на ноль
-        if sigma == 0 or pd.isna(sigma):
-            masks[col] = pd.Series(False, index=df.index)
-        else:
-            z = (series - mu) / sigma
-            masks[col] = z.abs() > z_thresh
-    return masks
+    sub = df[cols]
+    # std=0 → NaN, чтобы такие столбцы не давали выбросов
+    sigma = sub.std().replace(0, np.nan)
+    outlier = ((sub - sub.mean()) / sigma).abs().gt(z_thresh)
+    return {col: outlier[col] for col in cols}
+
+
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs=DF_HASH_FUNCS)
+def detect_outliers_cached(df: pd.DataFrame,
+                           cols: tuple,
+                           method: str,
+                           q_low: float = 0.25,
+                           q_high: float = 0.75,
+                           z_thresh: float = 3.0) -> dict:
+    """
+    Маски выбросов для вкладки анализа, кэшируются по данным, столбцам и параметрам.
+    Автоочистка вызывает detect_outliers_* напрямую — там кадр меняется на каждом шаге.
+    """
+    if method == "IQR":
+        return detect_outliers_iqr(df, list(cols), q_low, q_high)
+    return detect_outliers_zscore(df, list(cols), z_thresh)
 
 
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs=DF_HASH_FUNCS)
 def plot_outliers_distribution(
     df: pd.DataFrame,
-    masks: Dict[str, pd.Series],
-    cols: List[str]
+    _masks: Dict[str, pd.Series],
+    cols: List[str],
+    detect_params: tuple = ()
 ) -> go.Figure:
     """
     Строит scatter-фасеты и добавляет текст под графиком (вне plot area).
+    Маски не хэшируются (_masks): они однозначно заданы данными, столбцами и
+    detect_params = (метод, параметры) — по ним и строится ключ кэша.
     """
     if not cols:
         fig = go.Figure()
@@ -96,7 +106,7 @@ def plot_outliers_distribution(
         plots.append(pd.DataFrame({
             "index": df.index,
             "value": df[col],
-            "is_outlier": masks.get(col, pd.Series(False, index=df.index)),
+            "is_outlier": _masks.get(col, pd.Series(False, index=df.index)),
             "feature": col
         }))
     long_df = pd.concat(plots, ignore_index=True)
@@ -133,6 +143,7 @@ def plot_outliers_distribution(
     return fig
 
 
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs=DF_HASH_FUNCS)
 def plot_outlier_removal_comparison(
     df_before: pd.DataFrame,
     df_after: pd.DataFrame,
@@ -143,8 +154,8 @@ def plot_outlier_removal_comparison(
     Для каждого столбца рисует наложенные гистограммы, нормированные в плотность.
     """
     # Готовим длинный DataFrame
-    df_b = df_before[cols].copy().assign(dataset="before")
-    df_a = df_after[cols].copy().assign(dataset="after")
+    df_b = df_before[cols].assign(dataset="before")
+    df_a = df_after[cols].assign(dataset="after")
     long_df = pd.concat([df_b, df_a], ignore_index=True)
 
     long_df = long_df.melt(
@@ -212,7 +223,8 @@ def run_auto_outlier_removal(df: pd.DataFrame, z_thresh: float = 3.0):
     numeric_cols = df.select_dtypes(include="number").columns.tolist()
     before = []
     log = []
-    cleaned = df.copy()
+    # строки отбрасываются через .loc, который и так создаёт новый DataFrame
+    cleaned = df
 
     for col in numeric_cols:
         s = cleaned[col].dropna()
@@ -281,18 +293,30 @@ def render_outlier_rules_table():
     )
 
 
+def _iqr_bounds(df: pd.DataFrame, cols: list, q_low: float, q_high: float):
+    """
+    Границы IQR сразу для всех cols: одна квантильная агрегация вместо цикла.
+    Возвращает (lower, upper) — Series, индексированные именами столбцов.
+    """
+    q = df[cols].quantile([q_low, q_high])
+    # по позиции: при q_low == q_high метки индекса совпадают и .loc вернул бы DataFrame
+    lo, hi = q.iloc[0], q.iloc[1]
+    iqr = hi - lo
+    return lo - 1.5 * iqr, hi + 1.5 * iqr
+
+
 def remove_outliers_iqr(df: pd.DataFrame,
                         cols: list,
                         q_low: float = 0.25,
                         q_high: float = 0.75) -> pd.DataFrame:
     """
     Удаляет выбросы по IQR-методу для указанных столбцов.
+    Строка удаляется, если хотя бы в одном из cols значение за границами.
     """
-    cleaned = df.copy()
-    masks = detect_outliers_iqr(cleaned, cols, q_low, q_high)
-    # объединяем все маски: строка удаляется, если в любом столбце выброс
-    combined = np.logical_or.reduce([masks[c] for c in cols])
-    return cleaned.loc[~combined]
+    sub = df[cols]
+    lower, upper = _iqr_bounds(df, cols, q_low, q_high)
+    outlier = (sub.lt(lower) | sub.gt(upper)).any(axis=1)
+    return df.loc[~outlier]
 
 
 def remove_outliers_zscore(df: pd.DataFrame,
@@ -301,10 +325,12 @@ def remove_outliers_zscore(df: pd.DataFrame,
     """
     Удаляет выбросы по Z-score для указанных столбцов.
     """
-    cleaned = df.copy()
-    masks = detect_outliers_zscore(cleaned, cols, z_thresh)
-    combined = np.logical_or.reduce([masks[c] for c in cols])
-    return cleaned.loc[~combined]
+    sub = df[cols]
+    # std=0 → NaN, чтобы такие столбцы не давали выбросов
+    sigma = sub.std().replace(0, np.nan)
+    z = (sub - sub.mean()) / sigma
+    outlier = z.abs().gt(z_thresh).any(axis=1)
+    return df.loc[~outlier]
 
 
 def cap_outliers(df: pd.DataFrame,
@@ -316,14 +342,8 @@ def cap_outliers(df: pd.DataFrame,
     на границы.
     """
     capped = df.copy()
-    for col in cols:
-        series = capped[col].dropna()
-        Q1 = series.quantile(q_low)
-        Q3 = series.quantile(q_high)
-        IQR = Q3 - Q1
-        lower = Q1 - 1.5 * IQR
-        upper = Q3 + 1.5 * IQR
-        capped[col] = capped[col].clip(lower, upper)
+    lower, upper = _iqr_bounds(df, cols, q_low, q_high)
+    capped[cols] = df[cols].clip(lower, upper, axis=1)
     return capped
 
 
@@ -335,12 +355,18 @@ def remove_outliers_percentile(df: pd.DataFrame,
     Удаляет строки, если значение в столбце выходит за заданные
     процентильные границы.
     """
-    cleaned = df.copy()
-    for col in cols:
-        low_val = np.percentile(cleaned[col].dropna(), p_low)
-        high_val = np.percentile(cleaned[col].dropna(), p_high)
-        cleaned = cleaned[(cleaned[col] >= low_val) & (cleaned[col] <= high_val)]
-    return cleaned
+    sub = df[cols]
+    q = sub.quantile([p_low / 100, p_high / 100])
+    keep = (sub.ge(q.iloc[0]) & sub.le(q.iloc[1])).all(axis=1)
+    return df.loc[keep]
+
+# Ручная очистка: название метода → функция (df, cols, *параметры)
+MANUAL_OUTLIER_METHODS = {
+    "Удалить выбросы (IQR)":   remove_outliers_iqr,
+    "Каппинг (IQR-границы)":   cap_outliers,
+    "Удаление по Z-score":     remove_outliers_zscore,
+    "Удаление по процентилям": remove_outliers_percentile,
+}
 
 def show_outlier_summary(
     before_df: pd.DataFrame,
@@ -377,7 +403,7 @@ def show_outlier_summary(
     )
 
     st.markdown("**Статистики до и после очистки выбросов**")
-    st.table(df_summary)
+    st.dataframe(df_summary, use_container_width=True)
 
     removed_rows = len(before_df) - len(after_df)
     st.write(f"Удалено строк всего: {removed_rows}")
\ No newline at end of file
@@ -1,8 +1,12 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+from typing import Optional
 import plotly.express as px
 from scipy.stats import ttest_ind, ttest_rel, f_oneway, chi2_contingency
 
+from Utils.cache_utils import get_num_cat_cols
+
 # ==== Утилиты ====
 def is_numeric(series: pd.Series) -> bool:
     """Проверяет, является ли серия числовой."""
@@ -120,9 +124,23 @@ def plot_chi2_table(table: pd.DataFrame, plot_choice: str = "Авто"):
 
     st.plotly_chart(fig, use_container_width=True)
 
+# ==== Разбиение на группы ====
+def split_groups(df: pd.DataFrame, col: str, group_col: str) -> dict:
+    """
+    Один проход groupby: {уровень группы: np.ndarray значений col без NaN}.
+    Порядок групп — порядок первого появления (как у unique()).
+    """
+    return {
+        level: values.dropna().to_numpy(dtype=float)
+        for level, values in df.groupby(group_col, sort=False, observed=True)[col]
+    }
+
 # ==== T-test ====
-def run_ttest(df: pd.DataFrame, col: str, group_col: str, paired: bool = False):
-    """Выполняет t‑test (независимый или парный)."""
+def run_ttest(df: pd.DataFrame, col: str, group_col: str, paired: bool = False, levels: Optional[list] = None):
+    """
+    Выполняет t‑test (независимый или парный).
+    levels — два уровня group_col для сравнения, если групп в данных больше двух.
+    """
     if not is_numeric(df[col]):
         st.error("❌ Для t‑test нужен числовой признак.")
         return
@@ -130,13 +148,14 @@ def run_ttest(df: pd.DataFrame, col: str, group_col: str, paired: bool = False):
         st.error("❌ Группирующая переменная должна быть категориальной.")
         return
 
-    groups = df[group_col].dropna().unique()
+    groups = split_groups(df, col, group_col)
+    if levels is not None:
+        groups = {lvl: groups[lvl] for lvl in levels if lvl in groups}
     if len(groups) != 2:
         st.error("❌ Для t‑test должно быть ровно 2 группы.")
         return
 
-    g1 = df[df[group_col] == groups[0]][col].dropna()
-    g2 = df[df[group_col] == groups[1]][col].dropna()
+    g1, g2 = groups.values()
 
     if paired:
         if len(g1) != len(g2):
@@ -147,6 +166,8 @@ def run_ttest(df: pd.DataFrame, col: str, group_col: str, paired: bool = False):
         stat, p = ttest_ind(g1, g2)
 
     summary_df = group_summary(df, col, group_col)
+    if levels is not None:
+        summary_df = summary_df[summary_df["Группа"].isin(levels)].reset_index(drop=True)
     display_test_result("t‑test", "t‑статистика", stat, p)
     plot_group_means(summary_df)
     display_summary_table(summary_df)
@@ -161,7 +182,7 @@ def run_anova(df: pd.DataFrame, col: str, group_col: str):
         st.error("❌ Группирующая переменная должна быть категориальной.")
         return
 
-    groups = [df[df[group_col] == g][col].dropna() for g in df[group_col].dropna().unique()]
+    groups = list(split_groups(df, col, group_col).values())
     if len(groups) < 3:
         st.error("❌ Для ANOVA минимум 3 группы.")
         return
@@ -180,7 +201,7 @@ def run_chi2(df: pd.DataFrame, col1: str, col2: str, plot_choice: str = "Авт
         return
 
     table = pd.crosstab(df[col1], df[col2])
-    chi2, p, dof, expected = chi2_contingency(table)
+    chi2, p, dof, expected = chi2_contingency(table.to_numpy())
 
     display_test_result("Chi‑square", "Chi²‑статистика", chi2, p)
     plot_chi2_table(table, plot_choice)
@@ -195,8 +216,7 @@ def run_chi2(df: pd.DataFrame, col1: str, col2: str, plot_choice: str = "Авт
 
 # stats_tests_ui.py
 def show_ttest_ui(df):
-    num_cols = df.select_dtypes(include=["number"]).columns.tolist()
-    cat_cols_all = df.select_dtypes(exclude=["number"]).columns.tolist()
+    num_cols, cat_cols_all = get_num_cat_cols(df)
 
     if not num_cols:
         st.info("ℹ️ Нет числовых признаков для t‑test.")
@@ -220,20 +240,18 @@ def show_ttest_ui(df):
         )
         paired = st.checkbox("Парный t‑test (paired)", value=False, key="ttest_paired")
 
-    st.markdown("---")
+    st.divider()
     if st.button("Выполнить t‑test", type="primary"):
         if len(levels) == 2:
             run_ttest(df, target_col, group_col, paired)
         elif len(picked_levels) == 2:
-            df_pair = df[df[group_col].isin(picked_levels)].copy()
-            run_ttest(df_pair, target_col, group_col, paired)
+            run_ttest(df, target_col, group_col, paired, levels=picked_levels)
         else:
             st.error("❌ Выберите ровно две категории.")
 
 
 def show_anova_ui(df):
-    num_cols = df.select_dtypes(include=["number"]).columns.tolist()
-    cat_cols = df.select_dtypes(exclude=["number"]).columns.tolist()
+    num_cols, cat_cols = get_num_cat_cols(df)
 
     if not num_cols:
         st.info("ℹ️ Нет числовых признаков для ANOVA.")
@@ -245,13 +263,13 @@ def show_anova_ui(df):
     target_col = st.selectbox("Числовой признак (метрика)", num_cols, key="anova_num")
     group_col = st.selectbox("Категориальный признак (3+ группы)", cat_cols, key="anova_group")
 
-    st.markdown("---")
+    st.divider()
     if st.button("Выполнить ANOVA", type="primary"):
         run_anova(df, target_col, group_col)
 
 
 def show_chi2_ui(df):
-    cat_cols = df.select_dtypes(exclude=["number"]).columns.tolist()
+    _, cat_cols = get_num_cat_cols(df)
     if len(cat_cols) < 2:
         st.info("ℹ️ Для Chi‑square нужно минимум два категориальных признака.")
         return
@@ -266,7 +284,7 @@ def show_chi2_ui(df):
         horizontal=True, key="chi_plot"
     )
 
-    st.markdown("---")
+    st.divider()
     if st.button("Выполнить Chi‑square", type="primary"):
         if col1 == col2:
             st.error("❌ Выберите разные категориальные признаки.")
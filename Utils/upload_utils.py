@@ -1,28 +1,71 @@
 import pandas as pd
 import streamlit as st
 import re
+import io
+
+from Utils.cache_utils import DF_HASH_FUNCS
+
+# Регулярка числа компилируется один раз при импорте модуля
+NUMBER_RE = re.compile(r"^-?\d+(\.\d+)?$")
 
 def looks_like_number(s: str) -> bool:
     s = s.strip().replace(",", ".")
-    return bool(re.match(r"^-?\d+(\.\d+)?$", s))
+    return bool(NUMBER_RE.match(s))
 
-def load_data(uploaded_file) -> pd.DataFrame:
-    st.session_state["original_filename"] = uploaded_file.name  
-    fname = uploaded_file.name.lower()
-    if fname.endswith((".xlsx", ".xls")):
-        df = pd.read_excel(uploaded_file)
-    elif fname.endswith(".csv"):
-        df = pd.read_csv(uploaded_file)
+def read_csv_fast(file) -> pd.DataFrame:
+    """Читает CSV через pyarrow; при его отсутствии или ошибке — через C-движок."""
+    try:
+        return pd.read_csv(file, engine="pyarrow")
+    except (ImportError, ValueError):
+        file.seek(0)
+        return pd.read_csv(file, engine="c", low_memory=False, cache_dates=True)
+
+def read_excel_fast(file) -> pd.DataFrame:
+    """Читает Excel через calamine (потоковый парсер на Rust); без него — движком по умолчанию."""
+    try:
+        return pd.read_excel(file, engine="calamine")
+    except ImportError:
+        file.seek(0)
+        return pd.read_excel(file)
+
+def write_csv_fast(df: pd.DataFrame) -> bytes:
+    """
+    CSV в байтах через pyarrow; без pyarrow или для неподдерживаемых типов — через pandas.
+    Формат pyarrow отличается от DataFrame.to_csv: заголовки и строки в кавычках,
+    целые float без «.0» (3 вместо 3.0), bool — true/false, даты — с временем до наносекунд.
+    Подходит для служебных выгрузок (важности, метрики); пользовательский датасет
+    выгружается через to_csv (_csv_bytes в automatic_data_processing).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        buf = pa.BufferOutputStream()
+        pacsv.write_csv(table, buf, write_options=pacsv.WriteOptions(quoting_style="needed"))
+        return buf.getvalue().to_pybytes()
+    except (ImportError, ValueError, TypeError, NotImplementedError):
+        # ArrowInvalid / ArrowTypeError / ArrowNotImplementedError — подклассы этих исключений
+        return df.to_csv(index=False).encode("utf-8")
+
+@st.cache_data(show_spinner="Загрузка данных...", max_entries=4)
+def load_data_from_bytes(raw: bytes, file_name: str) -> tuple[pd.DataFrame, list]:
+    """
+    Читает файл из байтов и приводит числовые текстовые столбцы.
+    Без побочных эффектов — результат кэшируется по содержимому и имени файла.
+    """
+    buffer = io.BytesIO(raw)
+    if file_name.lower().endswith((".xlsx", ".xls")):
+        df = read_excel_fast(buffer)
     else:
-        st.error("Неподдерживаемый формат файла")
-        raise ValueError
+        df = read_csv_fast(buffer)
 
     conversion_log = []
     for col in df.columns:
         dtype = df[col].dtype
         if dtype == "object":
             df[col] = df[col].astype(str).str.strip().str.replace(",", ".")
-            mask = df[col].apply(looks_like_number)
+            # строки уже очищены выше — проверяем весь столбец одним векторным вызовом
+            mask = df[col].str.match(NUMBER_RE)
             rate = mask.mean()
             if rate > 0.9:
                 try:
@@ -35,9 +78,23 @@ def load_data(uploaded_file) -> pd.DataFrame:
         else:
             conversion_log.append(f"{col}: {dtype}")
 
+    return df, conversion_log
+
+def load_data(uploaded_file) -> pd.DataFrame:
+    st.session_state["original_filename"] = uploaded_file.name  
+    fname = uploaded_file.name.lower()
+    if not fname.endswith((".xlsx", ".xls", ".csv")):
+        st.error("Неподдерживаемый формат файла")
+        raise ValueError
+
+    # getvalue() отдаёт весь буфер независимо от позиции чтения, которая
+    # у UploadedFile сохраняется между перезапусками
+    df, conversion_log = load_data_from_bytes(uploaded_file.getvalue(), uploaded_file.name)
+
     st.session_state["conversion_log"] = conversion_log
     return df
 
+@st.cache_data(show_spinner=False, hash_funcs=DF_HASH_FUNCS)
 def get_base_info(df: pd.DataFrame) -> dict:
     return {
         "Строк": df.shape[0],
@@ -1,10 +1,63 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 from typing import Optional, Tuple, Dict
 from AI_helper import chat_with_context
-import time
 
+from Utils.cache_utils import DF_HASH_FUNCS, get_column_lists, get_column_index_maps
+
+
+# Порог строк, после которого точечные и линейные графики считаются «большими»
+LARGE_PLOT_ROWS = 3000
+# Сколько точек оставлять в линии после прореживания LTTB
+LINE_MAX_POINTS = 2000
+
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: индексы n_out точек, сохраняющих форму линии.
+    Из каждой корзины берётся точка, образующая наибольший треугольник
+    с предыдущей выбранной точкой и средним следующей корзины.
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    every = (n - 2) / (n_out - 2)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        nxt_hi = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[hi:nxt_hi].mean(), y[hi:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+
+def downsample_line(df: pd.DataFrame, x: str, y: str, n_out: int = LINE_MAX_POINTS) -> pd.DataFrame:
+    """Прореживает данные линейного графика до n_out точек (LTTB); маленькие и нечисловые — без изменений."""
+    if len(df) <= n_out or not pd.api.types.is_numeric_dtype(df[y]):
+        return df
+    sub = df[[x, y]].dropna()
+    if len(sub) <= n_out:
+        return sub
+    xs = sub[x]
+    if (pd.api.types.is_datetime64_any_dtype(xs) or pd.api.types.is_numeric_dtype(xs)) \
+            and not xs.is_monotonic_increasing:
+        # LTTB делит ось X на последовательные корзины — точки должны идти по возрастанию x
+        sub = sub.sort_values(x, kind="stable")
+        xs = sub[x]
+    if pd.api.types.is_datetime64_any_dtype(xs):
+        x_arr = xs.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(float)
+    elif pd.api.types.is_numeric_dtype(xs):
+        x_arr = xs.to_numpy(dtype=float)
+    else:
+        x_arr = np.arange(len(sub), dtype=float)
+    return sub.iloc[_lttb_indices(x_arr, sub[y].to_numpy(dtype=float), n_out)]
 
 # eda_ui_blocks.py
 # === Внутренние зависимости ===
@@ -15,15 +68,18 @@ def apply_numeric_filters(
     """Фильтрует числовые колонки по диапазонам."""
     if not numeric_filters:
         return df
+    # условия всех фильтров копятся в одной маске — срез DataFrame один раз, а не на каждый фильтр
+    mask = None
     try:
         for col, (min_val, max_val) in numeric_filters.items():
             if col not in df or not pd.api.types.is_numeric_dtype(df[col]):
                 continue
             if min_val != max_val:
-                df = df[df[col].between(min_val, max_val)]
+                cond = df[col].between(min_val, max_val).to_numpy(dtype=bool)
+                mask = cond if mask is None else mask & cond
     except Exception as e:
         st.warning(f"Ошибка при применении фильтров: {e}")
-    return df
+    return df if mask is None else df[mask]
 
 def is_temporal(column_name: str, series: pd.Series) -> bool:
     """Определяет, является ли колонка временной."""
@@ -59,7 +115,7 @@ def generate_manual_chart(
         elif chart_type == "Bar-график" and y:
             return px.bar(df, x=x, y=y)
         elif chart_type == "Лайнплот" and y and is_time_x:
-            return px.line(df, x=x, y=y)
+            return px.line(downsample_line(df, x, y), x=x, y=y)
     except Exception as e:
         st.warning(f"Ошибка при построении графика: {e}")
     return None
@@ -79,7 +135,7 @@ def generate_auto_chart(
 
         if y:
             if x_num and y_num:
-                return px.line(df, x=x, y=y) if is_time_x else px.scatter(df, x=x, y=y)
+                return px.line(downsample_line(df, x, y), x=x, y=y) if is_time_x else px.scatter(df, x=x, y=y)
             if not x_num and y_num:
                 return px.bar(df.groupby(x)[y].mean().reset_index(), x=x, y=y)
             if not x_num and not y_num:
@@ -94,6 +150,8 @@ def generate_auto_chart(
         st.warning(f"Ошибка авто-визуализации: {e}")
     return None
 
+# Повторное «Построить график» с теми же данными и параметрами берёт фигуру из кэша
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs=DF_HASH_FUNCS)
 def plot_data_visualizations(df, x, y=None, numeric_filters=None, chart_type="Автоматически"):
     if x not in df.columns or (y and y not in df.columns) or (x == y and y is not None):
         st.warning("Некорректный выбор переменных.")
@@ -113,6 +171,10 @@ def plot_data_visualizations(df, x, y=None, numeric_filters=None, chart_type="А
 
     if fig is None:
         st.info("Выбранный тип графика не подходит для этих данных. Попробуйте другой.")
+    elif len(df_filtered) > LARGE_PLOT_ROWS and any(t.type == "scattergl" for t in fig.data):
+        # px сам переводит scatter/line в WebGL на больших данных; поиск ближайшей
+        # точки по обеим осям на десятках тысяч маркеров тормозит hover — ищем только по X
+        fig.update_layout(hovermode="x")
     return fig
 
 
@@ -129,12 +191,21 @@ def suggest_visualization_combinations(df_info: str) -> str:
         return f"Не удалось получить рекомендации: {e}"
 
 # === Корреляции ===
+@st.cache_data(show_spinner=False, hash_funcs=DF_HASH_FUNCS)
 def plot_correlation_heatmap(df: pd.DataFrame):
     """Строит тепловую карту корреляций."""
     numeric_df = df.select_dtypes(include='number')
     if numeric_df.shape[1] < 2:
         return None
-    corr = numeric_df.corr().round(2)
+    arr = numeric_df.to_numpy(dtype=np.float64, na_value=np.nan)
+    if np.isnan(arr).any():
+        # с пропусками нужна попарная корреляция pandas — corrcoef её не умеет
+        corr = numeric_df.corr().round(2)
+    else:
+        # без пропусков — одно матричное умножение; float64, как в df.corr(), чтобы значения совпадали
+        with np.errstate(invalid="ignore", divide="ignore"):
+            c = np.corrcoef(arr, rowvar=False)
+        corr = pd.DataFrame(c, index=numeric_df.columns, columns=numeric_df.columns).round(2)
     return px.imshow(
         corr,
         text_auto=True,
@@ -143,6 +214,7 @@ def plot_correlation_heatmap(df: pd.DataFrame):
     )
 
 # === Pivot ===
+@st.cache_data(show_spinner=False, hash_funcs=DF_HASH_FUNCS)
 def generate_pivot_table(df: pd.DataFrame, index_col: str, value_col: str, agg_func: str = "mean"):
     """Строит сводную таблицу по index_col с агрегированием value_col."""
     if index_col not in df.columns or value_col not in df.columns:
@@ -151,45 +223,40 @@ def generate_pivot_table(df: pd.DataFrame, index_col: str, value_col: str, agg_f
     if agg_func not in {"mean", "sum", "count"}:
         return None
 
-    grouped = df.groupby(index_col, as_index=False)[value_col]
-
-    if agg_func == "mean":
-        pivot = grouped.mean()
-    elif agg_func == "sum":
-        pivot = grouped.sum()
-    elif agg_func == "count":
-        pivot = grouped.count()
-
-    if pivot.shape[1] == 2:
-        agg_col_name = f"{agg_func}({value_col})"
-        pivot.columns = [index_col, agg_col_name]
-        # 🔽 сортировка по убыванию
-        pivot = pivot.sort_values(by=agg_col_name, ascending=False).reset_index(drop=True)
-        return pivot
-    else:
-        return pivot
-    
+    agg_col_name = f"{agg_func}({value_col})"
+    # observed=True — без пустых комбинаций категорий; sort=False — сортируем один раз ниже
+    pivot = (
+        df.groupby(index_col, observed=True, sort=False)[value_col]
+          .agg(agg_func)
+          .rename(agg_col_name)
+          .sort_values(ascending=False)  # 🔽 сортировка по убыванию
+          .reset_index()
+    )
+    return pivot
 
 
 # Интеграция с ИИ (ожидается, что эти функции уже есть в проекте)
 from AI_helper import send_correlation_to_ai, send_pivot_to_ai
 
 
+@st.fragment
 def show_chart_tab(df: pd.DataFrame) -> None:
     """Вкладка: выбор переменных, тип графика, фильтры и построение графика."""
     st.subheader("🧭 Выбор переменных")
+    all_cols, _ = get_column_lists(df)
+    col_idx, _ = get_column_index_maps(df)
 
     # X и Y в одной строке
     col1, col2 = st.columns(2)
     with col1:
         x = st.selectbox(
             "🟥 Ось X",
-            df.columns,
+            all_cols,
             index=st.session_state.get("eda_x_index", 0),
             key="eda_x",
         )
     with col2:
-        y_options = ["— не выбрано —"] + list(df.columns)
+        y_options = ["— не выбрано —"] + all_cols
         y = st.selectbox(
             "🟦 Ось Y (необязательно)",
             y_options,
@@ -201,7 +268,7 @@ def show_chart_tab(df: pd.DataFrame) -> None:
             y = None
 
     # Синхронизируем индексы выбора в session_state
-    st.session_state["eda_x_index"] = list(df.columns).index(x)
+    st.session_state["eda_x_index"] = col_idx[x]
     st.session_state["eda_y_index"] = y_options.index(y if y is not None else "— не выбрано —")
 
     # Защита от совпадения X и Y
@@ -209,8 +276,6 @@ def show_chart_tab(df: pd.DataFrame) -> None:
         st.warning("Переменные X и Y не должны совпадать.")
         y = None
 
-    st.markdown("---")
-
     # Тип графика (вынесено в экспандер)
     with st.expander("🎨 Тип графика", expanded=True):
         chart_options = [
@@ -231,13 +296,11 @@ def show_chart_tab(df: pd.DataFrame) -> None:
         st.session_state["eda_chart_index"] = chart_options.index(chart_type)
         build_chart = st.button("📊 Построить график", key="build_chart")
 
-    st.markdown("---")
-
     # График с фильтрами
     with st.expander("📈 График с фильтрами", expanded=True):
         filters = {}
-        cols_to_filter = [x] + ([y] if y else [])
-        for col in dict.fromkeys(cols_to_filter):
+        cols_to_filter = (x,) if (not y or x == y) else (x, y)
+        for col in cols_to_filter:
             if col and pd.api.types.is_numeric_dtype(df[col]):
                 lo, hi = float(df[col].min()), float(df[col].max())
                 if lo != hi:
@@ -252,7 +315,6 @@ def show_chart_tab(df: pd.DataFrame) -> None:
 
         if build_chart:
             with st.spinner("Построение графика..."):
-                time.sleep(2.5)  # имитация работы
                 fig = plot_data_visualizations(
                     df=df,
                     x=x,
@@ -267,13 +329,13 @@ def show_chart_tab(df: pd.DataFrame) -> None:
         else:
             st.info("🎯 Выберите переменные и нажмите «Построить график».")            
 
+@st.fragment
 def show_ai_suggestions(df: pd.DataFrame) -> None:
     """Блок с советами от ИИ по визуализациям (вынесен отдельно)."""
     with st.expander("💡 Получить советы для визуализации от ИИ"):
         if st.button("✨ Предложи комбинации", key="suggest_combinations"):
             df_info = f"Переменные: {', '.join(df.columns)}"
             with st.spinner("Генерируем рекомендации..."):
-                time.sleep(2)
                 st.session_state["eda_suggestion"] = suggest_visualization_combinations(df_info)
 
         if "eda_suggestion" in st.session_state:
@@ -281,6 +343,7 @@ def show_ai_suggestions(df: pd.DataFrame) -> None:
             st.info(st.session_state["eda_suggestion"], icon="🤖")
 
 
+@st.fragment
 def show_correlation_tab(df: pd.DataFrame) -> None:
     """Вкладка: тепловая карта корреляций и фиксация в ИИ."""
     st.subheader("❄️ Тепловая карта корреляций")
@@ -303,24 +366,25 @@ def show_correlation_tab(df: pd.DataFrame) -> None:
         st.info("Невозможно построить тепловую карту.")
 
 
-import time
 
+@st.fragment
 def show_pivot_tab(df: pd.DataFrame) -> None:
     """Вкладка: сводные таблицы (pivot) и фиксация результата в ИИ + визуализация."""
     st.subheader("📊 Сводные таблицы (Pivot)")
+    all_cols, num_cols = get_column_lists(df)
+    col_idx, num_idx = get_column_index_maps(df)
 
     col1, col2 = st.columns(2)
     with col1:
         index_col = st.selectbox(
             "Группировать по",
-            df.columns,
+            all_cols,
             index=st.session_state.get("pivot_index_index", 0),
             key="pivot_index",
         )
-        st.session_state["pivot_index_index"] = list(df.columns).index(index_col)
+        st.session_state["pivot_index_index"] = col_idx[index_col]
 
     with col2:
-        num_cols = df.select_dtypes(include="number").columns
         if len(num_cols) == 0:
             st.warning("Нет числовых столбцов для агрегации.")
             return
@@ -330,7 +394,7 @@ def show_pivot_tab(df: pd.DataFrame) -> None:
             index=st.session_state.get("pivot_value_index", 0),
             key="pivot_value",
         )
-        st.session_state["pivot_value_index"] = list(num_cols).index(value_col)
+        st.session_state["pivot_value_index"] = num_idx[value_col]
 
     agg_options = ["mean", "sum", "count"]
     agg_func = st.radio(
@@ -360,8 +424,6 @@ def show_pivot_tab(df: pd.DataFrame) -> None:
 
         # Подсказка для пользователя
 
-        st.markdown("---")  # 🔽 Разделитель
-
         # === Блок выбора графика ===
         st.markdown("### 📉 Визуализация сводной таблицы")
         chart_type = st.selectbox(
@@ -371,10 +433,6 @@ def show_pivot_tab(df: pd.DataFrame) -> None:
         )
 
         if st.button("Визуализировать", key="pivot_visualize"):
-            # искусственная задержка для реалистичности
-            with st.spinner("⏳ Строим визуализацию..."):
-                time.sleep(1.5)
-
             if pivot_table.shape[1] < 2:
                 st.warning("⚠️ Для визуализации нужно выбрать корректные переменные (группировка + числовая агрегация).")
             else:
@@ -1,149 +1,138 @@
 # ============= Модули
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
+import json
 import os
-import time
-import io
-from sklearn.model_selection import train_test_split
+import uuid
+from pathlib import Path
 
 
+from Utils.cache_utils import get_column_lists, get_data_sig, data_changed
+
 from Utils.upload_utils import load_data, get_base_info, show_data_head, show_descriptive_stats, display_base_info
 
 from Utils.automatic_data_processing import (summarize_missing, render_nan_rules_table, run_auto_cleaning, \
                                                 apply_manual_cleaning, show_na_summary, prepare_csv_download )
 
-from Utils.outlier_utils import (detect_outliers_iqr, detect_outliers_zscore, \
-    plot_outliers_distribution, outliers_summary, run_auto_outlier_removal, render_outlier_rules_table, \
-    remove_outliers_iqr, remove_outliers_zscore, cap_outliers, remove_outliers_percentile, plot_outlier_removal_comparison)
-
-from Utils.visualization import show_chart_tab, show_ai_suggestions, show_correlation_tab, show_pivot_tab
-
-from Utils.stats_tests import show_ttest_ui, show_anova_ui, show_chi2_ui
-
-from Utils.modeling_utils import ensure_modeling_state, sticky_selectbox, show_model_settings, \
-                                 prepare_features_and_target, train_logistic_regression, evaluate_model, \
-                                 compute_feature_importance, interpret_feature_importance, mark_model_trained, \
-                                 show_results_and_analysis, show_single_prediction, show_export_buttons
-
-from Utils.chat import continue_chat, render_message, reset_chat_history
-
 from AI_helper import update_context, reset_ai_conversation, get_chatgpt_response, notify_ai_dataset_and_goal
 
 
 # Конфигурация страницы
 st.set_page_config(layout="wide")
 
+# Copy-on-Write: производные DataFrame делят буферы с исходным, пока их не изменят
+pd.set_option("mode.copy_on_write", True)
+
 # === Заставка ===
-if "app_loaded" not in st.session_state:
-    st.markdown("""
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap');
-
-            html, body {
-                margin: 0;
-                padding: 0;
-                height: 100%;
-                width: 100%;
-                font-family: 'Inter', sans-serif;
-                overflow: hidden;
-            }
+# Скрывается на стороне браузера (CSS-анимация splashOut), поэтому
+# серверу не нужно ждать и перезапускать скрипт. Разметка вставляется
+# из iframe компонента прямо в документ страницы и удаляет себя сама
+# после анимации — дерево элементов Streamlit её не содержит.
+_SPLASH_HTML = """
+    <style>
+        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap');
 
-            .splash-container {
-                position: fixed;
-                top: 0; left: 0;
-                width: 100vw;
-                height: 100vh;
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                justify-content: center;
-                background: linear-gradient(135deg, #f0f9ff, #e0f2fe);
-                color: #0f172a;
-                z-index: 9999;
-                animation: fadeIn 1s ease-in-out;
-                transition: opacity 1s ease-out;
-            }
+        .splash-container {
+            font-family: 'Inter', sans-serif;
+            position: fixed;
+            top: 0; left: 0;
+            width: 100vw;
+            height: 100vh;
+            display: flex;
+            flex-direction: column;
+            align-items: center;
+            justify-content: center;
+            background: linear-gradient(135deg, #f0f9ff, #e0f2fe);
+            color: #0f172a;
+            z-index: 9999;
+            animation: fadeIn 1s ease-in-out, splashOut 1s ease-out 3s forwards;
+        }
 
-            .splash-container.fade-out {
-                opacity: 0;
-                pointer-events: none;
-            }
+        .ai-emoji {
+            font-size: 3.2em;
+            margin-bottom: 20px;
+            animation: pulse 2s infinite;
+        }
 
-            .ai-emoji {
-                font-size: 3.2em;
-                margin-bottom: 20px;
-                animation: pulse 2s infinite;
-            }
+        .splash-title {
+            font-size: 2.4em;
+            font-weight: 700;
+            text-align: center;
+            opacity: 0;
+            animation: fadeUp 1.2s ease-out forwards;
+            animation-delay: 0.4s;
+        }
 
-            .splash-title {
-                font-size: 2.4em;
-                font-weight: 700;
-                text-align: center;
-                opacity: 0;
-                animation: fadeUp 1.2s ease-out forwards;
-                animation-delay: 0.4s;
-            }
+        .splash-subtext {
+            font-size: 1em;
+            margin-top: 12px;
+            color: #475569;
+            opacity: 0;
+            animation: fadeUp 1.4s ease-out forwards;
+            animation-delay: 0.8s;
+            text-align: center;
+            max-width: 600px;
+            padding: 0 16px;
+        }
 
-            .splash-subtext {
-                font-size: 1em;
-                margin-top: 12px;
-                color: #475569;
-                opacity: 0;
-                animation: fadeUp 1.4s ease-out forwards;
-                animation-delay: 0.8s;
-                text-align: center;
-                max-width: 600px;
-                padding: 0 16px;
-            }
+        .splash-footer {
+            position: absolute;
+            bottom: 18px;
+            font-size: 0.8em;
+            color: #64748b;
+            text-align: center;
+        }
 
-            .splash-footer {
-                position: absolute;
-                bottom: 18px;
-                font-size: 0.8em;
-                color: #64748b;
-                text-align: center;
-            }
+        @keyframes fadeUp {
+            0% { opacity: 0; transform: translateY(20px); }
+            100% { opacity: 1; transform: translateY(0); }
+        }
 
-            @keyframes fadeUp {
-                0% { opacity: 0; transform: translateY(20px); }
-                100% { opacity: 1; transform: translateY(0); }
-            }
+        @keyframes fadeIn {
+            from { opacity: 0; }
+            to { opacity: 1; }
+        }
 
-            @keyframes fadeIn {
-                from { opacity: 0; }
-                to { opacity: 1; }
-            }
+        @keyframes splashOut {
+            to { opacity: 0; visibility: hidden; }
+        }
 
-            @keyframes pulse {
-                0%, 100% {
-                    transform: scale(1);
-                    opacity: 1;
-                }
-                50% {
-                    transform: scale(1.15);
-                    opacity: 0.75;
-                }
+        @keyframes pulse {
+            0%, 100% {
+                transform: scale(1);
+                opacity: 1;
             }
-        </style>
-
-        <div class="splash-container" id="splash">
-            <div class="ai-emoji">✨</div>
-            <div class="splash-title">ClaryData</div>
-            <div class="splash-subtext">Интеллектуальная система анализа больших данных</div>
-            <div class="splash-footer">© Created by Rahimov M.A.</div>
-        </div>
-
-        <script>
-            setTimeout(() => {
-                const splash = document.getElementById("splash");
-                if (splash) splash.classList.add("fade-out");
-            }, 3000);
-        </script>
-    """, unsafe_allow_html=True)
-
-    time.sleep(3)
+            50% {
+                transform: scale(1.15);
+                opacity: 0.75;
+            }
+        }
+    </style>
+
+    <div class="splash-container" id="splash"
+         onanimationend="if (event.animationName === 'splashOut') this.parentNode.remove()">
+        <div class="ai-emoji">✨</div>
+        <div class="splash-title">ClaryData</div>
+        <div class="splash-subtext">Интеллектуальная система анализа больших данных</div>
+        <div class="splash-footer">© Created by Rahimov M.A.</div>
+    </div>
+"""
+
+_SPLASH_LOADER = """
+<script>
+    const doc = window.parent.document;
+    if (!doc.getElementById("splash")) {
+        const wrap = doc.createElement("div");
+        wrap.innerHTML = %s;
+        doc.body.appendChild(wrap);
+    }
+</script>
+""" % json.dumps(_SPLASH_HTML)
+
+if "app_loaded" not in st.session_state:
+    components.html(_SPLASH_LOADER, height=0)
     st.session_state.app_loaded = True
-    st.rerun()
 
 
 # --- Установка API-ключа из секретов, если есть ---
@@ -154,11 +143,9 @@ if "_ai_session_inited" not in st.session_state:
     reset_ai_conversation()                 # сброс глобальной истории для этой сессии
     st.session_state["_ai_session_inited"] = True
 
-# --- Инициализация первой страницы при запуске ---
-if 'page' not in st.session_state:
-    st.session_state['page'] = 'Загрузка данных'
-
-st.markdown("""
+# === Общие стили и футер ===
+# Все постоянные стили собраны в одну строку и отправляются одним блоком за прогон
+GLOBAL_CSS = """
     <style>
         /* Когда сайдбар открыт (aria-expanded="true"), основной контент смещается вправо */
         [data-testid="stSidebar"][aria-expanded="true"] ~ .main .block-container {
@@ -170,30 +157,8 @@ st.markdown("""
             margin-left: 1rem;
             transition: margin-left 0.3s ease;
         }
-    </style>
-""", unsafe_allow_html=True)
-
-# --- Функция переключения страниц ---
-def set_page(page_name):
-    st.session_state['page'] = page_name
-
-# --- Сайдбар с навигацией и стилем кнопок ---
-st.sidebar.header("🔧 Навигация")
-pages = {
-    "Загрузка данных": "📥",
-    "Автообработка данных": "🛡️",
-    "Обработка пропусков": "⚙️",
-    "Обработка выбросов": "🚩",
-    "Визуальный анализ и EDA": "📊",
-    "Статистические тесты": "📉",
-    "Моделирование и предсказание": "📟",
-    "Разъяснение результатов (с ИИ)": "💬",
-    "Руководство пользователя": "📝"
-}
 
-# Настройка CSS для кнопок (цвета при наведении)
-st.markdown("""
-    <style>
+        /* Цвета кнопок при наведении */
         div.stButton > button {
             background-color: #f0f2f6;
             color: black;
@@ -205,23 +170,46 @@ st.markdown("""
             color: #007BFF;
             border: 1px solid #007BFF;
         }
-    </style>
-""", unsafe_allow_html=True)
 
-# Навигационные кнопки
-for name, icon in pages.items():
-    st.sidebar.button(f"{icon} {name}", on_click=set_page, args=(name,))
+        /* Футер: постоянная надпись внизу справа, вне зависимости от содержимого */
+        .bottom-right {
+            position: fixed;
+            right: 15px;
+            bottom: 10px;
+            font-size: 0.75em;
+            color: #333333;
+            z-index: 9999;
+        }
+    </style>
+    <div class="bottom-right">© Created by Rahimov M.A. TTU 2025</div>
+""".strip()
+
+st.html(GLOBAL_CSS)
+
+# --- Руководство пользователя: текст README кэшируется до изменения файла ---
+@st.cache_data(show_spinner=False)
+def load_readme(path: str, mtime_ns: int) -> str:
+    # utf-8-sig срезает BOM, если он есть
+    return Path(path).read_bytes().decode("utf-8-sig")
+
+# Подписи столбцов сводки пропусков: переименование на стороне фронтенда, без копий DataFrame
+NAN_COLUMN_LABELS = {
+    "column": "Столбец",
+    "missing_count": "Кол-во",
+    "pct_missing": "% пропусков",
+    "action": "Действие",
+}
 
 # Кнопка для очистки всех данных
 if st.sidebar.button("🔄 Очистить всё"):
-    for key in list(st.session_state.keys()):
-        del st.session_state[key]
+    # только состояние своей сессии: кэши общие для всех пользователей и ограничены max_entries
+    st.session_state.clear()
     st.rerun()
 
 
 # ===================== СТРАНИЦЫ =======================
 # === Загрузка данных ===
-if st.session_state['page'] == "Загрузка данных":
+def page_load():
     st.caption('💡Если вы не пользовались ClaryData, сначала перейдите в раздел "Руководство пользователя"!')
     st.title("📥 Загрузка данных")
 
@@ -234,6 +222,7 @@ if st.session_state['page'] == "Загрузка данных":
             try:
                 df = load_data(uploaded_file)
                 st.session_state["df"] = df
+                st.session_state["_loaded_sig"] = get_data_sig(df)
                 st.success("Данные успешно загружены", icon="✅")
             except Exception as e:
                 st.error(f"Ошибка при обработке данных: {e}", icon="🚫")
@@ -243,7 +232,7 @@ if st.session_state['page'] == "Загрузка данных":
 
     # --- Если данные загружены ---
     if "df" in st.session_state:
-        st.markdown("---")
+        st.divider()
 
         # Превью данных в экспандере
         with st.expander("Пример данных (первые строки)", expanded=False):
@@ -258,47 +247,48 @@ if st.session_state['page'] == "Загрузка данных":
         display_base_info(base_info)
 
         # — Инициализация/обновление краткого summary —
-        data_sig = (tuple(df.columns), df.shape)
-        if st.session_state.get("_data_sig") != data_sig:
-            summary = f"{df.shape[0]} строк, {df.shape[1]} столбцов; признаки: {', '.join(map(str, df.columns))}"
+        data_sig = get_data_sig(df)
+        if st.session_state.get("_data_sig") != data_sig or "data_summary" not in st.session_state:
+            # список признаков склеивается один раз на версию данных
+            cols_joined = ', '.join(map(str, df.columns))
+            summary = f"{df.shape[0]} строк, {df.shape[1]} столбцов; признаки: {cols_joined}"
             st.session_state["_data_sig"] = data_sig
+            st.session_state["_cols_joined"] = cols_joined
             st.session_state["data_summary"] = summary
             try:
                 update_context("data_summary", summary)
             except Exception:
                 pass
         else:
-            summary = st.session_state.get(
-                "data_summary",
-                f"{df.shape[0]} строк, {df.shape[1]} столбцов; признаки: {', '.join(map(str, df.columns))}"
-            )
+            summary = st.session_state["data_summary"]
 
-        st.markdown("---")
+        st.divider()
         # Блок подключения ИИ в экспандере
         with st.expander("🤖 Подключение ИИ", expanded=False):
             st.caption("При желании укажите цель анализа — ИИ адаптирует помощь под неё.")
 
-            user_desc = st.text_area(
-                label="Цель анализа",
-                placeholder="Например: Хочу проанализировать, как меняются цены на жильё по регионам",
-                value=st.session_state.get("analysis_goal", ""),
-                height=100,
-                label_visibility="collapsed",
-                key="analysis_goal_input" 
-            )
+            # форма: ввод текста не перезапускает страницу до нажатия кнопки
+            with st.form("ai_goal_form", border=False):
+                user_desc = st.text_area(
+                    label="Цель анализа",
+                    placeholder="Например: Хочу проанализировать, как меняются цены на жильё по регионам",
+                    value=st.session_state.get("analysis_goal", ""),
+                    height=100,
+                    label_visibility="collapsed",
+                    key="analysis_goal_input" 
+                )
+                submitted = st.form_submit_button("Подключить ИИ")
 
-            if st.button("Подключить ИИ"):
+            if submitted:
                 msg = notify_ai_dataset_and_goal(df, user_desc, get_chatgpt_response)
                 st.success(msg)
 
-        if st.button("🤖 Подключить ИИ"):
-            msg = notify_ai_dataset_and_goal(df, user_desc, get_chatgpt_response)
-            st.success(msg)
-
 # === Автообработка данных ===
-if st.session_state['page'] == "Автообработка данных":
+def page_autoclean():
     st.title("🛡️ Автоматический обработка")
 
+    from Utils.outlier_utils import run_auto_outlier_removal
+
     with st.expander("🧭 Как пользоваться этим разделом"):
         st.write(
             "Нажмите кнопку ниже, чтобы автоматически очистить данные. "
@@ -316,20 +306,18 @@ if st.session_state['page'] == "Автообработка данных":
         if st.button("🫧 Автообработка данных"):
             # Шаг 1: автоочистка пропусков
             with st.spinner("Шаг 1/2: обработка пропусков…"):
-                time.sleep(2)  # имитация процесса
                 try:
                     stats_before, clean_log, df = run_auto_cleaning(df)
                     if len(clean_log) == 0:
                         st.info("ℹ️ Пропусков не найдено — очистка не потребовалась.")
                     else:
                         st.success("✅ Пропуски успешно обработаны")
-                        st.write(pd.DataFrame(clean_log))
+                        st.dataframe(clean_log, column_config=NAN_COLUMN_LABELS, use_container_width=True)
                 except Exception as e:
                     st.error(f"Ошибка при обработке пропусков: {e}", icon="🚫")
 
             # Шаг 2: автообработка выбросов
             with st.spinner("Шаг 2/2: обработка выбросов…"):
-                time.sleep(2)  # имитация процесса
                 try:
                     before_df, outlier_log, df = run_auto_outlier_removal(df)
                     if len(outlier_log) == 0:
@@ -344,26 +332,23 @@ if st.session_state['page'] == "Автообработка данных":
 
 
 # === обработка пропусков ===
-if st.session_state.get("page") == "Обработка пропусков":
+def page_missing():
     st.title("⚙️ Обработка пропусков")
     st.caption('Обработка пропущенных значений (NaN), подробно в разделе "Руководство пользователя"!')
 
-    # Инициализация флага изменений
-    if "data_changed" not in st.session_state:
-        st.session_state["data_changed"] = False
-
     if "df" not in st.session_state:
         st.warning("📥 Загрузите данные", icon="⚠️")
     else:
         df = st.session_state["df"]
+        all_cols, _ = get_column_lists(df)
 
         # 🎯 Выбор целевой переменной
         target = st.selectbox(
             "Целевая переменная (ее NaN будут удалены)",
-            [None] + list(df.columns)
+            [None] + all_cols
         )
 
-        st.markdown("---")
+        st.divider()
 
         # 📊 Статистика пропусков
         st.subheader("📊 Пропуски в данных")
@@ -372,15 +357,15 @@ if st.session_state.get("page") == "Обработка пропусков":
         if missing.empty:
             st.success("Нет пропусков в данных", icon="✅")
         else:
-            st.table(
-                missing.rename(columns={
-                    "column": "Столбец",
-                    "missing_count": "Кол-во",
-                    "pct_missing": "% пропусков"
-                }).set_index("Столбец")
+            st.dataframe(
+                missing,
+                column_config=NAN_COLUMN_LABELS,
+                hide_index=True,
+                use_container_width=True,
+                height=min(35 * len(missing) + 40, 400)
             )
 
-            st.markdown("---")
+            st.divider()
 
             # 🤖 Автоочистка
             st.subheader("🤖 Автоочистка")
@@ -390,37 +375,27 @@ if st.session_state.get("page") == "Обработка пропусков":
             if st.button("🚀 Запустить автоочистку"):
                 before, log, new_df = run_auto_cleaning(df, target_col=target)
                 st.session_state["df"] = new_df
-                st.session_state["data_changed"] = True
 
                 if before.empty:
                     st.info("Пропусков не найдено", icon="✅")
                 else:
                     st.markdown("**До очистки**")
-                    st.table(
-                        before.rename(columns={
-                            "column": "Столбец",
-                            "missing_count": "Кол-во",
-                            "pct_missing": "% пропусков"
-                        }).set_index("Столбец")
+                    st.dataframe(
+                        before,
+                        column_config=NAN_COLUMN_LABELS,
+                        hide_index=True,
+                        use_container_width=True,
+                        height=min(35 * len(before) + 40, 400)
                     )
 
-                    with st.spinner("Автоочистка..."):
-                        time.sleep(1)
-
-                    report = pd.DataFrame(log).rename(columns={
-                        "column": "Столбец",
-                        "missing_count": "Кол-во",
-                        "pct_missing": "% пропусков",
-                        "action": "Действие"
-                    }).set_index("Столбец")
-
                     st.markdown("**Отчет автоочистки**")
-                    st.table(report)
+                    st.dataframe(log, column_config=NAN_COLUMN_LABELS, hide_index=True, use_container_width=True)
 
-                    remaining = new_df.isna().sum().sum()
+                    # та же сводка понадобится странице на следующем rerun — берём её из кэша
+                    remaining = int(summarize_missing(new_df)["missing_count"].sum())
                     st.success(f"Готово! Осталось пропусков: {remaining}")
 
-        st.markdown("---")
+        st.divider()
 
         # 🔧 Ручная очистка
         st.subheader("🔧 Ручная очистка")
@@ -443,11 +418,11 @@ if st.session_state.get("page") == "Обработка пропусков":
                     value = st.text_input("Значение для заполнения:")
 
             if st.button("✅ Применить"):
-                before = df.copy()
+                # функции очистки возвращают новый DataFrame — исходный df не меняется
+                before = df
                 new_df = apply_manual_cleaning(df, action, cols, target, method, value)
 
                 st.session_state["df"] = new_df
-                st.session_state["data_changed"] = True
                 st.success("✅ Обработка завершена")
 
                 if show_tables and action != "Удалить выбранные столбцы":
@@ -459,11 +434,11 @@ if st.session_state.get("page") == "Обработка пропусков":
                     col2.write(new_df.shape)
 
         # 📥 Кнопка скачивания
-        if st.session_state.get("data_changed", False) and not st.session_state["df"].empty:
-            st.markdown("---")
+        if data_changed() and not st.session_state["df"].empty:
+            st.divider()
             st.subheader("📥 Скачать обработанные данные")
 
-            file_name, csv_buffer = prepare_csv_download(
+            file_name, csv_bytes = prepare_csv_download(
                 st.session_state["df"],
                 st.session_state.get("original_filename")
             )
@@ -471,27 +446,28 @@ if st.session_state.get("page") == "Обработка пропусков":
             st.success("✅ Файл готов к скачиванию")
             st.download_button(
                 label=f"💾 Скачать {file_name}",
-                data=csv_buffer,
+                data=csv_bytes,
                 file_name=file_name,
                 mime="text/csv"
             )
 
 
 # === Обработка выбросов ===
-if st.session_state.get("page") == "Обработка выбросов":
+def page_outliers():
     st.title("🚩 Обработка выбросов")
     st.caption('ℹ В этом разделе вы можете исследовать и обрабатывать выбросы в ваших данных, подробно в разделе "Руководство пользователя"!')
 
+    # plotly/scipy для выбросов подгружаются только при открытии страницы
+    from Utils.outlier_utils import (detect_outliers_cached, \
+        plot_outliers_distribution, outliers_summary, run_auto_outlier_removal, render_outlier_rules_table, \
+        MANUAL_OUTLIER_METHODS, plot_outlier_removal_comparison)
 
-        # Инициализация флага изменений
-    if "data_changed" not in st.session_state:
-        st.session_state["data_changed"] = False
 
     if "df" not in st.session_state:
         st.warning("📥 Загрузите данные на предыдущей странице", icon="⚠️")
     else:
         df = st.session_state["df"]
-        numeric_cols = df.select_dtypes(include="number").columns.tolist()
+        _, numeric_cols = get_column_lists(df)
 
         # # Инструкция
         # render_outlier_handling_info()
@@ -527,16 +503,18 @@ if st.session_state.get("page") == "Обработка выбросов":
                 )
 
             if st.button("👁 Показать выбросы", key="show_out_viz"):
-                masks = (detect_outliers_iqr(df, cols_viz, q_low, q_high)
+                detect_params = (("IQR", q_low, q_high) if method_viz == "IQR-метод"
+                                 else ("Z-score", z_thresh))
+                masks = (detect_outliers_cached(df, tuple(cols_viz), "IQR", q_low=q_low, q_high=q_high)
                          if method_viz == "IQR-метод"
-                         else detect_outliers_zscore(df, cols_viz, z_thresh))
-                fig = plot_outliers_distribution(df, masks, cols_viz)
+                         else detect_outliers_cached(df, tuple(cols_viz), "Z-score", z_thresh=z_thresh))
+                fig = plot_outliers_distribution(df, masks, cols_viz, detect_params)
                 st.plotly_chart(fig, use_container_width=True)
 
                 summary = outliers_summary(df, masks)
-                st.table(summary.set_index("column"))
+                st.dataframe(summary.set_index("column"), use_container_width=True)
 
-        st.markdown("---")
+        st.divider()
 
         # Автоочистка выбросов
         st.subheader("🤖 Автообработка выбросов")
@@ -551,24 +529,24 @@ if st.session_state.get("page") == "Обработка выбросов":
             if total_removed == 0:
                 st.info("Автоматически выбросы не найдены", icon="✅")
             else:
-                report = (
-                    pd.DataFrame(log)
-                      .rename(columns={
-                          "column": "Столбец",
-                          "method": "Метод",
-                          "removed_count": "Удалено выбросов"
-                      })
-                      .set_index("Столбец")
-                )
+                report = {
+                    "Столбец":          [item["column"] for item in log],
+                    "Метод":            [item["method"] for item in log],
+                    "Удалено выбросов": [item.get("removed_count", 0) for item in log],
+                }
+                # note/error есть только у отдельных записей лога
+                notes = [item.get("note") or item.get("error") for item in log]
+                if any(notes):
+                    report["Примечание"] = notes
                 st.markdown("**Отчет автоочистки выбросов**")
-                st.table(report)
+                st.dataframe(report, hide_index=True, use_container_width=True)
                 st.success(f"Удалено выбросов: {total_removed}")
 
                 st.markdown("### Сравнение распределений до и после автоочистки")
                 fig_cmp = plot_outlier_removal_comparison(df, cleaned_df, numeric_cols)
                 st.plotly_chart(fig_cmp, use_container_width=True)
 
-        st.markdown("---")
+        st.divider()
 
         st.subheader("🔧 Ручная очистка выбросов")
         with st.expander("✍️ Панель ручной очистки выбросов", expanded=False):
@@ -582,12 +560,7 @@ if st.session_state.get("page") == "Обработка выбросов":
             with col2:
                 method_manual = st.selectbox(
                     "Метод обработки",
-                    [
-                        "Удалить выбросы (IQR)",
-                        "Каппинг (IQR-границы)",
-                        "Удаление по Z-score",
-                        "Удаление по процентилям"
-                    ],
+                    list(MANUAL_OUTLIER_METHODS),
                     key="out_manual_method"
                 )
 
@@ -599,6 +572,7 @@ if st.session_state.get("page") == "Обработка выбросов":
                     step=0.05,
                     key="iqr_manual"
                 )
+                method_args = (low_q, high_q)
             elif method_manual == "Удаление по Z-score":
                 z_manual = st.number_input(
                     "Порог Z-score",
@@ -606,6 +580,7 @@ if st.session_state.get("page") == "Обработка выбросов":
                     value=3.0, step=0.1,
                     key="z_manual"
                 )
+                method_args = (z_manual,)
             else:  # Удаление по процентилям
                 p_low, p_high = st.slider(
                     "Процентили для удаления",
@@ -613,20 +588,14 @@ if st.session_state.get("page") == "Обработка выбросов":
                     step=1,
                     key="percentile_manual"
                 )
+                method_args = (p_low, p_high)
 
             if st.button("✅ Применить ручную очистку"):
-                before_manual = df.copy()
-                cleaned_manual = df.copy()
-
-                for col in cols_manual:
-                    if method_manual == "Удалить выбросы (IQR)":
-                        cleaned_manual = remove_outliers_iqr(cleaned_manual, [col], low_q, high_q)
-                    elif method_manual == "Каппинг (IQR-границы)":
-                        cleaned_manual = cap_outliers(cleaned_manual, [col], low_q, high_q)
-                    elif method_manual == "Удаление по Z-score":
-                        cleaned_manual = remove_outliers_zscore(cleaned_manual, [col], z_manual)
-                    else:
-                        cleaned_manual = remove_outliers_percentile(cleaned_manual, [col], p_low, p_high)
+                # функции обработки выбросов не изменяют df, копия не нужна
+                before_manual = df
+
+                # Все выбранные столбцы обрабатываются за один проход
+                cleaned_manual = MANUAL_OUTLIER_METHODS[method_manual](df, cols_manual, *method_args)
 
                 st.session_state["df"] = cleaned_manual
                 st.success("✅ Ручная очистка выбросов завершена")
@@ -640,33 +609,32 @@ if st.session_state.get("page") == "Обработка выбросов":
                 st.plotly_chart(fig_cmp_manual, use_container_width=True)
 
         # === 📥 Кнопка скачивания, если были изменения ===
-        if st.session_state.get("data_changed", False) and not st.session_state["df"].empty:
-            st.markdown("---")
+        if data_changed() and not st.session_state["df"].empty:
+            st.divider()
             st.subheader("📥 Скачать обработанные данные")
 
-            base_name = "data"
-            if "original_filename" in st.session_state:
-                base_name = os.path.splitext(st.session_state["original_filename"])[0]
-            file_name = f"{base_name}_cleaned.csv"
-
-            csv_buffer = io.BytesIO()
-            st.session_state["df"].to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)
+            file_name, csv_bytes = prepare_csv_download(
+                st.session_state["df"],
+                st.session_state.get("original_filename")
+            )
 
             st.success("✅ Файл готов к скачиванию")
             st.download_button(
                 label=f"💾 Скачать {file_name}",
-                data=csv_buffer,
+                data=csv_bytes,
                 file_name=file_name,
                 mime="text/csv"
             )
 
 
 # === Визуализация и EDA ===
-elif st.session_state["page"] == "Визуальный анализ и EDA":
+def page_eda():
     st.title("📊 Визуальный анализ и EDA")
     st.caption('ℹ В этом разделе вы можете сделать визуальный анализ и EDA, подробно в разделе "Руководство пользователя"!')
 
+    # plotly и EDA-блоки импортируются только при открытии страницы
+    from Utils.visualization import show_chart_tab, show_ai_suggestions, show_correlation_tab, show_pivot_tab
+
     if "df" not in st.session_state:
         st.warning("📥 Сначала загрузите данные.", icon="⚠️")
     else:
@@ -687,10 +655,12 @@ elif st.session_state["page"] == "Визуальный анализ и EDA":
 
 
 # === Статистические тесты ===
-if st.session_state.get("page") == "Статистические тесты":
+def page_stats():
     st.title("📊 Статистические тесты")
     st.caption("ℹ Проверка гипотез: t‑test, ANOVA и Chi‑square")
 
+    from Utils.stats_tests import show_ttest_ui, show_anova_ui, show_chi2_ui
+
     if "df" not in st.session_state or st.session_state.df is None or st.session_state.df.empty:
         st.warning("📥 Сначала загрузите данные.")
         st.stop()
@@ -710,7 +680,7 @@ if st.session_state.get("page") == "Статистические тесты":
         key="stats_test_choice"
     )
 
-    st.markdown("---")
+    st.divider()
 
     if selected_test == "t-test":
         show_ttest_ui(df)
@@ -721,10 +691,17 @@ if st.session_state.get("page") == "Статистические тесты":
 
 
 # === Моделирование и предсказание ===
-if st.session_state.get("page") == "Моделирование и предсказание":
+def page_modeling():
     st.title("🤖 Моделирование и предсказание")
     st.caption("ℹ Фокус: понять, как и почему признаки влияют на целевую переменную")
 
+    # модуль моделирования (и sklearn внутри него) загружается только на этой странице
+    from Utils.modeling_utils import ensure_modeling_state, sticky_selectbox, show_model_settings, \
+                                     split_train_test, train_logistic_regression, evaluate_model, apply_threshold, \
+                                     compute_feature_importance, interpret_feature_importance, mark_model_trained, \
+                                     show_results_and_analysis, show_single_prediction, show_export_buttons, \
+                                     prepare_prediction_form
+
     if "df" not in st.session_state:
         st.warning("📥 Сначала загрузите данные.")
         st.stop()
@@ -732,14 +709,16 @@ if st.session_state.get("page") == "Моделирование и предска
     df = st.session_state["df"]
     ms = ensure_modeling_state(df)
 
-    options = list(df.columns)
+    options, _ = get_column_lists(df)
     target_col, _ = sticky_selectbox("modeling_state", "target", "🎯 Целевая переменная (binary target)", options, ui_key="modeling_target_ui")
 
     if len(pd.Series(df[target_col].dropna().unique())) > 2:
         st.error("Целевая переменная должна быть бинарной")
         st.stop()
 
-    feature_cols = [c for c in df.columns if c != target_col]
+    # копия кэшированного списка без таргета (сам кэш не изменяем)
+    feature_cols = options.copy()
+    feature_cols.remove(target_col)
     if not feature_cols:
         st.error("Нет признаков для обучения")
         st.stop()
@@ -750,13 +729,8 @@ if st.session_state.get("page") == "Моделирование и предска
     if st.button("🚀 Обучить / переобучить модель", use_container_width=True):
         try:
             with st.spinner("⏳ Обучение модели..."):
-                time.sleep(5)
-
                 # Подготовка данных
-                X, y_encoded, le, num_cols, cat_cols = prepare_features_and_target(df, target_col)
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X, y_encoded, test_size=test_size, random_state=42, stratify=y_encoded
-                )
+                X_train, X_test, y_train, y_test, le = split_train_test(df, target_col, test_size)
 
                 # Обучение
                 class_weight = "balanced" if use_class_weight else None
@@ -768,17 +742,20 @@ if st.session_state.get("page") == "Моделирование и предска
                 )
 
                 # Оценка
-                metrics, roc_data, pr_data = evaluate_model(model, X_test, y_test, meta, threshold)
+                metrics, roc_data, pr_data, (y_true, y_proba) = evaluate_model(model, X_test, y_test, meta, threshold)
                 importance_df = compute_feature_importance(model, meta)
                 short_text = interpret_feature_importance(importance_df, top_n=3)
 
                 # Сохраняем в сессию
                 st.session_state["modeling"] = {
                     "model": model, "meta": meta,
+                    "model_id": uuid.uuid4().hex,
                     "threshold": threshold, "metrics": metrics,
                     "roc": roc_data, "pr": pr_data,
+                    "y_test": y_true, "y_proba": y_proba,
                     "importance_df": importance_df, "short_text": short_text,
                     "target_col": target_col, "feature_cols": feature_cols,
+                    "prediction_form": prepare_prediction_form(df, feature_cols),
                     "params": {
                         "C": C_value, "penalty": penalty,
                         "class_weight": class_weight, "max_iter": max_iter,
@@ -796,37 +773,40 @@ if st.session_state.get("page") == "Моделирование и предска
     # Если модель уже обучена — показываем результаты
     if "modeling" in st.session_state:
         data = st.session_state["modeling"]
+        # порог меняется без переобучения: пересчитываются только пороговые метрики
+        apply_threshold(data, threshold)
 
         show_results_and_analysis(data)
-        show_single_prediction(data, df)
+        show_single_prediction(data)
         show_export_buttons(data)
 
 # === Разъяснение результатов (с ИИ) ===
-if st.session_state.get("page") == "Разъяснение результатов (с ИИ)":
+def page_chat():
     st.title("💬 Поговорим о ваших данных?")
-    st.markdown("---")
+
+    from Utils.chat import continue_chat, render_message, render_history, reset_chat_history, append_message
+
+    st.divider()
 
     if st.button("🗑 Очистить чат"):
         reset_chat_history()
         st.success("Чат очищен.")
         st.stop()
 
-    st.session_state.setdefault("chat_history", [])
-
     # Ввод нового сообщения
     question = st.chat_input("Напишите свой вопрос…")
 
+    # История чата: последние CHAT_WINDOW сообщений, более ранние — по кнопке
+    render_history()
+
     if question:
         # Добавляем вопрос в историю
-        st.session_state.chat_history.append({"text": question, "sender": "user"})
+        append_message(question, "user")
+        render_message(question, "user")
 
-        # Сначала рендерим всю историю (включая новый вопрос)
-        for msg in st.session_state.chat_history:
-            render_message(msg["text"], msg["sender"])
-
-        # Временный индикатор "ИИ печатает..."
-        placeholder = st.empty()
-        placeholder.markdown(
+        # Временный индикатор "ИИ печатает..." — в этом же слоте потом появится ответ
+        slot = st.empty()
+        slot.markdown(
             """
             <style>
             @keyframes blink {
@@ -860,46 +840,38 @@ if st.session_state.get("page") == "Разъяснение результато
             unsafe_allow_html=True,
         )
 
-
         # Получаем ответ ИИ (это занимает время)
         answer = continue_chat(question)
 
-        # Заменяем индикатор на настоящий ответ
-        placeholder.empty()
-        st.session_state.chat_history.append({"text": answer, "sender": "ai"})
-        render_message(answer, "ai")
-
-    else:
-        # Если нового вопроса нет — просто рендерим историю
-        for msg in st.session_state.chat_history:
-            render_message(msg["text"], msg["sender"])
+        # Заменяем индикатор на настоящий ответ в том же слоте
+        append_message(answer, "ai")
+        with slot.container():
+            render_message(answer, "ai")
 
 
 
 # === Руководство пользователя ===
-elif st.session_state['page'] == "Руководство пользователя":
+def page_readme():
     st.title("Руководство пользователя ClaryData")
     
-    try:
-        with open("README.md", "r", encoding="utf-8") as f:
-            content = f.read()
-        st.markdown(content)
-    except FileNotFoundError:
+    readme_path = Path("README.md")
+    if not readme_path.exists():
         st.warning("Файл README.md не найден — проверь путь или название файла.")
-
-
-# === Футер внизу страницы (автор) ===
-# Постоянная надпись внизу лево, вне зависимости от содержимого
-st.markdown("""
-    <style>
-        .bottom-right {
-            position: fixed;
-            right: 15px;
-            bottom: 10px;
-            font-size: 0.75em;
-            color: #333333;
-            z-index: 9999;
-        }
-    </style>
-    <div class="bottom-right">© Created by Rahimov M.A. TTU 2025</div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+    else:
+        st.markdown(load_readme(str(readme_path), readme_path.stat().st_mtime_ns))
+
+
+# === Навигация ===
+# Streamlit выполняет только функцию выбранной страницы
+pg = st.navigation([
+    st.Page(page_load, title="Загрузка данных", icon="📥", url_path="load", default=True),
+    st.Page(page_autoclean, title="Автообработка данных", icon="🛡️", url_path="autoclean"),
+    st.Page(page_missing, title="Обработка пропусков", icon="⚙️", url_path="missing"),
+    st.Page(page_outliers, title="Обработка выбросов", icon="🚩", url_path="outliers"),
+    st.Page(page_eda, title="Визуальный анализ и EDA", icon="📊", url_path="eda"),
+    st.Page(page_stats, title="Статистические тесты", icon="📉", url_path="stats"),
+    st.Page(page_modeling, title="Моделирование и предсказание", icon="📟", url_path="modeling"),
+    st.Page(page_chat, title="Разъяснение результатов (с ИИ)", icon="💬", url_path="chat"),
+    st.Page(page_readme, title="Руководство пользователя", icon="📝", url_path="guide"),
+])
+pg.run()